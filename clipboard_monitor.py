@@ -5,21 +5,18 @@
 """
 
 import os
+import json
 import time
 import tempfile
 import hashlib
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Dict
 import threading
 from pathlib import Path
 
-try:
-    from AppKit import NSPasteboard, NSPasteboardTypeString, NSPasteboardTypePNG, NSPasteboardTypeTIFF
-    from Cocoa import NSData
-    HAS_APPKIT = True
-except ImportError:
-    HAS_APPKIT = False
-    print("Warning: AppKit not available, falling back to alternative methods")
+# PyObjC导入开销较大，延迟到首次访问剪贴板时再加载
+HAS_APPKIT = None
+_appkit_lock = threading.Lock()
 
 try:
     import pyperclip
@@ -27,27 +24,145 @@ try:
 except ImportError:
     HAS_PYPERCLIP = False
 
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+# 部分平台没有这些标志位
+_O_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+_O_NOFOLLOW = getattr(os, 'O_NOFOLLOW', 0)
+
+def _fast_digest(buf) -> str:
+    """计算非加密用途的快速哈希（16位十六进制）"""
+    if HAS_XXHASH:
+        return xxhash.xxh3_64(buf).hexdigest()
+    return hashlib.blake2b(buf, digest_size=8).hexdigest()
+
+def _image_digest(image_data) -> str:
+    """
+    对完整图片数据计算128位摘要（32位十六进制），用作去重索引的键
+    
+    只哈希前缀时，头部和前几行相同、长度也相同的两张图片（如同一区域的TIFF截图）
+    会被当成同一张，因此必须覆盖全部数据
+    """
+    view = memoryview(image_data.bytes())
+    if HAS_XXHASH:
+        return xxhash.xxh3_128(view).hexdigest()
+    return hashlib.blake2b(view, digest_size=16).hexdigest()
+
+def _lazy_appkit() -> bool:
+    """首次调用时导入AppKit相关符号并缓存到模块全局变量，返回是否可用"""
+    global HAS_APPKIT, NSPasteboard, NSPasteboardTypeString, NSPasteboardTypePNG, NSPasteboardTypeTIFF
+    global NSTimer, NSRunLoop, NSDate, NSDefaultRunLoopMode, CFRunLoopStop, objc
+    global IMAGE_TYPES, TEXT_TYPES, _ClipboardPollTarget
+    
+    if HAS_APPKIT is not None:
+        return HAS_APPKIT
+        
+    with _appkit_lock:
+        if HAS_APPKIT is not None:
+            return HAS_APPKIT
+            
+        try:
+            from AppKit import NSPasteboard, NSPasteboardTypeString, NSPasteboardTypePNG, NSPasteboardTypeTIFF
+            from Foundation import NSObject, NSTimer, NSRunLoop, NSDate, NSDefaultRunLoopMode
+            from CoreFoundation import CFRunLoopStop
+            import objc
+        except ImportError:
+            HAS_APPKIT = False
+            print("Warning: AppKit not available, falling back to alternative methods")
+            return HAS_APPKIT
+            
+        # 剪贴板类型分组，导入时构建一次供每次检查复用
+        IMAGE_TYPES = frozenset((NSPasteboardTypePNG, NSPasteboardTypeTIFF))
+        TEXT_TYPES = frozenset((NSPasteboardTypeString,))
+        
+        class _ClipboardPollTarget(NSObject):
+            """NSTimer回调目标，将定时器触发转发给ClipboardMonitor"""
+            
+            def initWithMonitor_(self, monitor):
+                self = objc.super(_ClipboardPollTarget, self).init()
+                if self is None:
+                    return None
+                self.monitor = monitor
+                return self
+                
+            def tick_(self, timer):
+                self.monitor._on_poll_timer()
+                
+        HAS_APPKIT = True
+        return HAS_APPKIT
+
 class ClipboardMonitor:
     """剪贴板监听器类"""
     
-    def __init__(self, callback=None):
+    # 后台清理临时文件的间隔（秒）
+    CLEANUP_INTERVAL_S = 3600
+    
+    # 图片指纹 -> 已保存文件路径的持久化索引
+    INDEX_FILENAME = ".index.json"
+    
+    def __init__(self, callback=None, busy_poll_s: float = 0.15, max_poll_s: float = 2.0,
+                 cleanup_max_age_hours: float = 24):
         """
         初始化剪贴板监听器
         
         Args:
             callback: 回调函数，当检测到图片变化时调用，参数为(image_path, is_image)
+            busy_poll_s: 剪贴板刚发生变化时的检查间隔（秒）
+            max_poll_s: 长时间空闲后退避到的最大检查间隔（秒）
+            cleanup_max_age_hours: 后台清理时删除超过该时长的临时文件
         """
         self.callback = callback
         self.running = False
         self.thread = None
         self.last_change_count = 0
         self.last_text_content = ""
+        self._last_text_key = None
+        
+        # 自适应轮询：有变化时快速检查，空闲时指数退避
+        self._busy_poll_s = busy_poll_s
+        self._max_poll_s = max(max_poll_s, busy_poll_s)
+        self._idle_count = 0
+        
+        # 后台定时清理
+        self.cleanup_max_age_hours = cleanup_max_age_hours
+        self._cleanup_timer = None
+        
+        # 同一次剪贴板内容只保存一次图片
+        self._last_image_key = None
+        self._last_image_path = None
+        
+        # 按changeCount缓存剪贴板类型列表
+        self._types_change_count = None
+        self._types_cache = frozenset()
+        
+        # NSTimer轮询（仅AppKit可用时）
+        self._poll_target = None
+        self._poll_timer = None
+        self._cf_run_loop = None
+        
+        # 停止时唤醒等待中的轮询，避免保存索引时监听线程仍在运行
+        self._stop_event = threading.Event()
+        
         self.temp_dir = Path("/tmp/smart_paste")
         self.temp_dir.mkdir(exist_ok=True)
         
-        if HAS_APPKIT:
+        # 跨会话去重：相同内容的图片只保存一份
+        self._index_lock = threading.Lock()
+        self._fingerprint_index = self._load_fingerprint_index()
+        
+        # 剪贴板在首次使用时才获取（届时导入AppKit），仅查看状态时不必加载PyObjC
+        self.pasteboard = None
+        
+    def _ensure_pasteboard(self) -> bool:
+        """首次调用时导入AppKit并获取系统剪贴板，返回AppKit是否可用"""
+        if self.pasteboard is None and _lazy_appkit():
             self.pasteboard = NSPasteboard.generalPasteboard()
             self.last_change_count = self.pasteboard.changeCount()
+        return bool(HAS_APPKIT)
         
     def start_monitoring(self):
         """开始监听剪贴板"""
@@ -55,54 +170,195 @@ class ClipboardMonitor:
             return
         
         self.running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.thread.start()
+        self._schedule_cleanup()
         print("Clipboard monitoring started")
         
     def stop_monitoring(self):
         """停止监听剪贴板"""
         self.running = False
+        self._stop_event.set()
+        cf_run_loop = self._cf_run_loop
+        if cf_run_loop is not None:
+            CFRunLoopStop(cf_run_loop)
+        if self._cleanup_timer:
+            self._cleanup_timer.cancel()
+            self._cleanup_timer = None
         if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=1.0)
+            # 正常情况下会被立即唤醒，最多等待一个最大轮询间隔
+            self.thread.join(timeout=self._max_poll_s + 1.0)
+        self.save_fingerprint_index()
         print("Clipboard monitoring stopped")
         
+    def _schedule_cleanup(self):
+        """安排下一次后台清理"""
+        self._cleanup_timer = threading.Timer(self.CLEANUP_INTERVAL_S, self._periodic_cleanup)
+        self._cleanup_timer.daemon = True
+        self._cleanup_timer.start()
+        
+    def _periodic_cleanup(self):
+        """定时清理旧文件，完成后重新调度"""
+        if not self.running:
+            return
+        self.cleanup_old_files(self.cleanup_max_age_hours)
+        self.save_fingerprint_index()
+        if self.running:
+            self._schedule_cleanup()
+            
+    def _load_fingerprint_index(self) -> Dict[str, str]:
+        """加载图片指纹索引，忽略不在临时目录中的条目"""
+        try:
+            with open(self.temp_dir / self.INDEX_FILENAME, 'r') as f:
+                index = json.load(f)
+            return {
+                fingerprint: path for fingerprint, path in index.items()
+                if Path(path).parent == self.temp_dir
+            }
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading image index: {e}")
+        return {}
+        
+    def save_fingerprint_index(self):
+        """保存图片指纹索引，同时丢弃文件已被删除的条目"""
+        with self._index_lock:
+            self._fingerprint_index = {
+                fingerprint: path for fingerprint, path in self._fingerprint_index.items()
+                if os.path.exists(path)
+            }
+            index = dict(self._fingerprint_index)
+            
+        try:
+            index_path = self.temp_dir / self.INDEX_FILENAME
+            tmp_path = index_path.with_name(self.INDEX_FILENAME + ".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        except Exception as e:
+            print(f"Error saving image index: {e}")
+        
     def _monitor_loop(self):
         """监听循环"""
+        if self._ensure_pasteboard():
+            self._run_loop_monitor()
+            return
+            
         while self.running:
             try:
-                if HAS_APPKIT:
-                    self._check_clipboard_nsboard()
-                else:
-                    self._check_clipboard_fallback()
-                time.sleep(0.5)  # 检查间隔
+                changed = self._check_clipboard_fallback()
+                self._stop_event.wait(self._next_poll_interval(changed))  # 检查间隔
             except Exception as e:
                 print(f"Clipboard monitoring error: {e}")
-                time.sleep(1.0)
+                self._stop_event.wait(1.0)
                 
-    def _check_clipboard_nsboard(self):
-        """使用NSPasteboard检查剪贴板变化"""
+    def _run_loop_monitor(self):
+        """
+        在监听线程的NSRunLoop上用一次性NSTimer驱动检查
+        
+        定时器设置了容差，系统可以把唤醒与其他事件合并，避免固定sleep造成的空转唤醒
+        """
+        run_loop = NSRunLoop.currentRunLoop()
+        self._cf_run_loop = run_loop.getCFRunLoop()
+        self._poll_target = _ClipboardPollTarget.alloc().initWithMonitor_(self)
+        self._schedule_poll_timer(run_loop, self._busy_poll_s)
+        
+        while self.running:
+            with objc.autorelease_pool():
+                # 定时器不会使runMode提前返回，最多等待一个最大间隔后复查running（stop时由CFRunLoopStop唤醒）
+                run_loop.runMode_beforeDate_(
+                    NSDefaultRunLoopMode,
+                    NSDate.dateWithTimeIntervalSinceNow_(self._max_poll_s)
+                )
+                
+        if self._poll_timer:
+            self._poll_timer.invalidate()
+            self._poll_timer = None
+        self._poll_target = None
+        self._cf_run_loop = None
+        
+    def _schedule_poll_timer(self, run_loop, interval: float):
+        """在指定RunLoop上安排下一次检查"""
+        timer = NSTimer.timerWithTimeInterval_target_selector_userInfo_repeats_(
+            interval, self._poll_target, 'tick:', None, False
+        )
+        timer.setTolerance_(interval * 0.1)
+        run_loop.addTimer_forMode_(timer, NSDefaultRunLoopMode)
+        self._poll_timer = timer
+        
+    def _on_poll_timer(self):
+        """NSTimer触发时检查剪贴板并安排下一次检查"""
+        if not self.running:
+            return
+            
+        try:
+            interval = self._next_poll_interval(self._check_clipboard_nsboard())
+        except Exception as e:
+            print(f"Clipboard monitoring error: {e}")
+            interval = 1.0
+            
+        self._schedule_poll_timer(NSRunLoop.currentRunLoop(), interval)
+        
+    def _next_poll_interval(self, changed: bool) -> float:
+        """根据剪贴板活跃程度计算下一次检查间隔"""
+        if changed:
+            self._idle_count = 0
+            return self._busy_poll_s
+            
+        self._idle_count += 1
+        return min(self._max_poll_s, self._busy_poll_s * (1.5 ** min(self._idle_count, 10)))
+        
+    def _pasteboard_types(self, change_count: int) -> frozenset:
+        """获取剪贴板当前的数据类型集合，同一changeCount只查询一次"""
+        if change_count != self._types_change_count:
+            self._types_cache = frozenset(self.pasteboard.types() or [])
+            self._types_change_count = change_count
+        return self._types_cache
+        
+    def _check_clipboard_nsboard(self) -> bool:
+        """
+        使用NSPasteboard检查剪贴板变化
+        
+        Returns:
+            剪贴板是否发生了变化
+        """
         current_change_count = self.pasteboard.changeCount()
         
         if current_change_count != self.last_change_count:
             self.last_change_count = current_change_count
+            types = self._pasteboard_types(current_change_count)
             
             # 检查是否有图片
-            if self.pasteboard.availableTypeFromArray_([NSPasteboardTypePNG, NSPasteboardTypeTIFF]):
+            if not IMAGE_TYPES.isdisjoint(types):
                 image_path = self._save_image_from_pasteboard()
                 if image_path and self.callback:
                     self.callback(image_path, True)
             # 检查是否有文本
-            elif self.pasteboard.availableTypeFromArray_([NSPasteboardTypeString]):
-                text = self.pasteboard.stringForType_(NSPasteboardTypeString)
-                if text and text != self.last_text_content:
-                    self.last_text_content = text
-                    if self.callback:
-                        self.callback(text, False)
+            elif not TEXT_TYPES.isdisjoint(types):
+                # 先比较(长度, 哈希)指纹，内容确实变化时才取出完整字符串
+                text_data = self.pasteboard.dataForType_(NSPasteboardTypeString)
+                if text_data and text_data.length():
+                    text_key = (text_data.length(), _fast_digest(text_data.bytes()))
+                    if text_key != self._last_text_key:
+                        self._last_text_key = text_key
+                        if self.callback:
+                            text = self.pasteboard.stringForType_(NSPasteboardTypeString)
+                            self.callback(text, False)
+            return True
+            
+        return False
                         
-    def _check_clipboard_fallback(self):
-        """备用方法检查剪贴板（仅文本）"""
+    def _check_clipboard_fallback(self) -> bool:
+        """
+        备用方法检查剪贴板（仅文本）
+        
+        Returns:
+            剪贴板是否发生了变化
+        """
         if not HAS_PYPERCLIP:
-            return
+            return False
             
         try:
             current_text = pyperclip.paste()
@@ -110,9 +366,12 @@ class ClipboardMonitor:
                 self.last_text_content = current_text
                 if self.callback:
                     self.callback(current_text, False)
+                return True
         except Exception as e:
             print(f"Fallback clipboard check error: {e}")
             
+        return False
+            
     def _save_image_from_pasteboard(self) -> Optional[str]:
         """从剪贴板保存图片到临时文件"""
         try:
@@ -128,16 +387,35 @@ class ClipboardMonitor:
             if not image_data:
                 return None
                 
+            # 剪贴板未变化时直接复用上次保存的文件
+            image_key = (self.pasteboard.changeCount(), image_data.length())
+            if image_key == self._last_image_key and Path(self._last_image_path).exists():
+                return self._last_image_path
+                
+            # 相同内容之前已保存过则直接复用
+            data_hash = _image_digest(image_data)
+            index_key = f"{data_hash}.{file_ext}"
+            with self._index_lock:
+                existing_path = self._fingerprint_index.get(index_key)
+            if existing_path and os.path.exists(existing_path):
+                os.utime(existing_path)  # 刷新修改时间，避免仍在使用的文件被定期清理
+                self._last_image_key = image_key
+                self._last_image_path = existing_path
+                return existing_path
+                
             # 生成文件名
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            data_hash = hashlib.md5(image_data.bytes()).hexdigest()[:8]
-            filename = f"clipboard_image_{timestamp}_{data_hash}.{file_ext}"
+            filename = f"clipboard_image_{timestamp}_{data_hash[:12]}.{file_ext}"
             file_path = self.temp_dir / filename
             
             # 保存文件
-            with open(file_path, 'wb') as f:
-                f.write(image_data.bytes())
+            self._write_image_file(image_data, file_path)
                 
+            self._last_image_key = image_key
+            self._last_image_path = str(file_path)
+            with self._index_lock:
+                self._fingerprint_index[index_key] = str(file_path)
+            
             print(f"Image saved to: {file_path}")
             return str(file_path)
             
@@ -145,6 +423,56 @@ class ClipboardMonitor:
             print(f"Error saving image: {e}")
             return None
             
+    def _write_image_file(self, image_data, file_path: Path):
+        """
+        将NSData写入文件
+        
+        直接写NSData的内存视图，不复制为Python bytes；先写入O_EXCL创建的唯一临时文件，
+        再原子替换为目标文件，避免截断其他线程正在读取（如mmap上传）的同名文件。
+        使用0600权限、O_NOFOLLOW防止/tmp下的符号链接攻击、O_CLOEXEC避免fd泄漏到子进程
+        """
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | _O_CLOEXEC | _O_NOFOLLOW
+        fd = os.open(str(tmp_path), flags, 0o600)
+        try:
+            try:
+                view = memoryview(image_data.bytes())
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+            
+    def peek_clipboard_type(self) -> str:
+        """
+        只探测剪贴板内容类型，不读取数据也不保存图片
+        
+        Returns:
+            'image'、'text' 或 'empty'
+        """
+        if self._ensure_pasteboard():
+            types = self._pasteboard_types(self.pasteboard.changeCount())
+            if not IMAGE_TYPES.isdisjoint(types):
+                return 'image'
+            if not TEXT_TYPES.isdisjoint(types):
+                return 'text'
+                
+        elif HAS_PYPERCLIP:
+            try:
+                if pyperclip.paste():
+                    return 'text'
+            except:
+                pass
+                
+        return 'empty'
+        
     def get_clipboard_content(self) -> Tuple[str, bool]:
         """
         获取当前剪贴板内容
@@ -152,15 +480,17 @@ class ClipboardMonitor:
         Returns:
             Tuple[str, bool]: (内容/路径, 是否为图片)
         """
-        if HAS_APPKIT:
+        if self._ensure_pasteboard():
+            types = self._pasteboard_types(self.pasteboard.changeCount())
+            
             # 检查图片
-            if self.pasteboard.availableTypeFromArray_([NSPasteboardTypePNG, NSPasteboardTypeTIFF]):
+            if not IMAGE_TYPES.isdisjoint(types):
                 image_path = self._save_image_from_pasteboard()
                 if image_path:
                     return image_path, True
                     
             # 检查文本
-            if self.pasteboard.availableTypeFromArray_([NSPasteboardTypeString]):
+            if not TEXT_TYPES.isdisjoint(types):
                 text = self.pasteboard.stringForType_(NSPasteboardTypeString)
                 if text:
                     return text, False
@@ -177,13 +507,22 @@ class ClipboardMonitor:
     def cleanup_old_files(self, max_age_hours=24):
         """清理旧的临时文件"""
         try:
-            current_time = time.time()
-            for file_path in self.temp_dir.glob("clipboard_image_*"):
-                if file_path.is_file():
-                    file_age = current_time - file_path.stat().st_mtime
-                    if file_age > max_age_hours * 3600:
-                        file_path.unlink()
-                        print(f"Cleaned up old file: {file_path}")
+            cutoff = time.time() - max_age_hours * 3600
+            with os.scandir(self.temp_dir) as entries:
+                for entry in entries:
+                    if not entry.name.startswith("clipboard_image_"):
+                        continue
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                            os.unlink(entry.path)
+                            print(f"Cleaned up old file: {entry.path}")
+                    except FileNotFoundError:
+                        continue  # 已被其他清理过程删除
+                    except OSError as e:
+                        # 单个文件失败不影响其余文件的清理
+                        print(f"Error removing {entry.path}: {e}")
         except Exception as e:
             print(f"Error cleaning up files: {e}")
 
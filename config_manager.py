@@ -5,12 +5,34 @@
 """
 
 import os
+import sys
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field, asdict
 
-@dataclass
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+def _dumps(data: Dict[str, Any]) -> bytes:
+    """序列化配置为缩进JSON（UTF-8字节）"""
+    if HAS_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def _loads(raw: bytes) -> Dict[str, Any]:
+    """解析JSON配置"""
+    if HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# dataclass(slots=True) 需要 Python 3.10+，旧版本退回普通dataclass
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_OPTIONS)
 class SmartPasteConfig:
     """SmartPaste配置类"""
     
@@ -25,16 +47,20 @@ class SmartPasteConfig:
     cleanup_interval_hours: int = 24
     
     # 终端设置
-    terminal_apps: list = None
+    terminal_apps: tuple = ('Terminal', 'iTerm2', 'iTerm', 'Hyper', 'Alacritty', 'WezTerm', 'Warp')
     paste_cooldown_ms: int = 500
     
     # SSH设置
     ssh_timeout_seconds: int = 10
     scp_retry_count: int = 3
     auto_create_remote_dirs: bool = True
+    sftp_pipelined: bool = True  # SFTP写入不逐块等待确认，个别不兼容的服务器可关闭
+    background_upload: bool = True  # 先粘贴远程路径，图片在后台上传
     
     # 监听设置
     clipboard_check_interval_ms: int = 500
+    poll_interval_busy_ms: int = 150
+    poll_interval_idle_ms: int = 2000
     keyboard_listener_enabled: bool = True
     
     # 高级设置
@@ -42,10 +68,35 @@ class SmartPasteConfig:
     max_image_width: int = 2048
     max_image_height: int = 2048
     
+    # 派生字段（不写入配置文件）
+    _terminal_apps_set: frozenset = field(default=frozenset(), init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         """初始化后处理"""
-        if self.terminal_apps is None:
-            self.terminal_apps = ['Terminal', 'iTerm2', 'iTerm', 'Hyper', 'Alacritty', 'Wezterm']
+        self.normalize()
+        
+    def normalize(self):
+        """规范化字段类型并刷新派生字段，修改配置后需调用"""
+        self.terminal_apps = tuple(self.terminal_apps or ())
+        self._terminal_apps_set = frozenset(self.terminal_apps)
+        
+    @property
+    def terminal_apps_set(self) -> frozenset:
+        """终端应用名集合，用于O(1)成员判断"""
+        return self._terminal_apps_set
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典（不含派生字段）"""
+        return {key: value for key, value in asdict(self).items() if not key.startswith('_')}
+        
+    def apply(self, config_data: Dict[str, Any], warn_unknown: bool = False):
+        """从字典更新配置"""
+        for key, value in config_data.items():
+            if not key.startswith('_') and hasattr(self, key):
+                setattr(self, key, value)
+            elif warn_unknown:
+                print(f"Warning: Unknown config key '{key}'")
+        self.normalize()
 
 class ConfigManager:
     """配置管理器类"""
@@ -70,19 +121,25 @@ class ConfigManager:
         self.log_dir.mkdir(exist_ok=True)
         
         self._config = SmartPasteConfig()
+        self._dict_cache: Optional[Dict[str, Any]] = None
         self._load_config()
         
+    def _as_dict(self) -> Dict[str, Any]:
+        """获取配置的字典形式（缓存到下一次修改配置为止）"""
+        if self._dict_cache is None:
+            self._dict_cache = self._config.to_dict()
+        return self._dict_cache
+        
     def _load_config(self):
         """加载配置文件"""
+        self._dict_cache = None
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r') as f:
-                    config_data = json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    config_data = _loads(f.read())
                     
                 # 更新配置对象
-                for key, value in config_data.items():
-                    if hasattr(self._config, key):
-                        setattr(self._config, key, value)
+                self._config.apply(config_data)
                         
                 print(f"Configuration loaded from {self.config_file}")
                 
@@ -97,10 +154,10 @@ class ConfigManager:
     def save_config(self):
         """保存配置到文件"""
         try:
-            config_data = asdict(self._config)
+            config_data = self._as_dict()
             
-            with open(self.config_file, 'w') as f:
-                json.dump(config_data, f, indent=2)
+            with open(self.config_file, 'wb') as f:
+                f.write(_dumps(config_data))
                 
             print(f"Configuration saved to {self.config_file}")
             return True
@@ -114,16 +171,14 @@ class ConfigManager:
         return self._config
         
     def update_config(self, **kwargs):
-        """更新配置"""
-        for key, value in kwargs.items():
-            if hasattr(self._config, key):
-                setattr(self._config, key, value)
-            else:
-                print(f"Warning: Unknown config key '{key}'")
+        """更新配置（请通过此方法修改配置，以便刷新序列化缓存）"""
+        self._config.apply(kwargs, warn_unknown=True)
+        self._dict_cache = None
                 
     def reset_to_defaults(self):
         """重置为默认配置"""
         self._config = SmartPasteConfig()
+        self._dict_cache = None
         self.save_config()
         print("Configuration reset to defaults")
         
@@ -154,6 +209,9 @@ class ConfigManager:
         if self._config.ssh_timeout_seconds <= 0:
             errors['ssh_timeout_seconds'] = "SSH timeout must be positive"
             
+        if self._config.poll_interval_busy_ms <= 0 or self._config.poll_interval_idle_ms <= 0:
+            errors['poll_interval'] = "Poll intervals must be positive"
+            
         if self._config.scp_retry_count < 0:
             errors['scp_retry_count'] = "Retry count cannot be negative"
             
@@ -170,10 +228,10 @@ class ConfigManager:
     def export_config(self, file_path: str) -> bool:
         """导出配置到指定文件"""
         try:
-            config_data = asdict(self._config)
+            config_data = self._as_dict()
             
-            with open(file_path, 'w') as f:
-                json.dump(config_data, f, indent=2)
+            with open(file_path, 'wb') as f:
+                f.write(_dumps(config_data))
                 
             print(f"Configuration exported to {file_path}")
             return True
@@ -185,8 +243,8 @@ class ConfigManager:
     def import_config(self, file_path: str) -> bool:
         """从指定文件导入配置"""
         try:
-            with open(file_path, 'r') as f:
-                config_data = json.load(f)
+            with open(file_path, 'rb') as f:
+                config_data = _loads(f.read())
                 
             # 备份当前配置
             backup_file = self.config_file.with_suffix('.backup')
@@ -195,9 +253,8 @@ class ConfigManager:
                 print(f"Current config backed up to {backup_file}")
                 
             # 应用新配置
-            for key, value in config_data.items():
-                if hasattr(self._config, key):
-                    setattr(self._config, key, value)
+            self._config.apply(config_data)
+            self._dict_cache = None
                     
             # 验证配置
             errors = self.validate_config()
@@ -225,10 +282,10 @@ class ConfigManager:
     def show_config(self):
         """显示当前配置"""
         print("=== SmartPaste Configuration ===")
-        config_data = asdict(self._config)
+        config_data = self._as_dict()
         
         for key, value in config_data.items():
-            if isinstance(value, list):
+            if isinstance(value, (list, tuple)):
                 print(f"{key}: {', '.join(map(str, value))}")
             else:
                 print(f"{key}: {value}")
@@ -3,7 +3,9 @@
 调试进程树，理解SSH检测问题
 """
 
+import io
 import os
+import re
 import sys
 import psutil
 from pathlib import Path
@@ -11,65 +13,81 @@ from pathlib import Path
 # 添加SmartPaste模块路径
 sys.path.insert(0, str(Path.home() / '.smartpaste'))
 
-def debug_current_process_tree():
+# 终端相关进程名与SSH命令行匹配
+TERMINAL_PROCESS_NAMES = frozenset({'Terminal', 'iTerm2', 'iTerm', 'bash', 'zsh', 'fish', 'sh', 'ssh'})
+SSH_PATTERN = re.compile(r'\bssh\b')
+
+def snapshot_processes():
+    """一次性采集所有进程信息，返回 pid -> info 字典"""
+    return {
+        proc.info['pid']: proc.info
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'cmdline'])
+    }
+
+def debug_current_process_tree(snapshot=None):
     """调试当前进程树"""
-    print("🔍 当前进程树分析")
-    print("=" * 60)
+    buf = io.StringIO()
+    print("🔍 当前进程树分析", file=buf)
+    print("=" * 60, file=buf)
     
     current_pid = os.getpid()
-    print(f"当前进程PID: {current_pid}")
+    print(f"当前进程PID: {current_pid}", file=buf)
     
     try:
-        current_proc = psutil.Process(current_pid)
-        print(f"当前进程: {current_proc.name()} - {' '.join(current_proc.cmdline())}")
+        if snapshot is None:
+            snapshot = snapshot_processes()
+            
+        current_info = snapshot.get(current_pid)
+        if current_info:
+            print(f"当前进程: {current_info['name']} - {' '.join(current_info['cmdline'] or [])}", file=buf)
         
-        # 向上遍历进程树
+        # 在快照中沿ppid向上遍历进程树
         level = 0
-        proc = current_proc
-        while proc and level < 10:  # 最多检查10层
-            try:
-                cmdline = ' '.join(proc.cmdline()) if proc.cmdline() else 'N/A'
-                print(f"{'  ' * level}├─ PID {proc.pid}: {proc.name()} - {cmdline}")
-                
-                # 检查是否包含SSH
-                if 'ssh' in cmdline.lower():
-                    print(f"{'  ' * level}   🔗 发现SSH进程!")
-                
-                parent = proc.parent()
-                if parent and parent.pid != proc.pid:
-                    proc = parent
-                    level += 1
-                else:
-                    break
-                    
-            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-                print(f"{'  ' * level}├─ 无法访问进程: {e}")
+        pid = current_pid
+        while pid in snapshot and level < 10:  # 最多检查10层
+            info = snapshot[pid]
+            cmdline = ' '.join(info['cmdline']) if info['cmdline'] else 'N/A'
+            print(f"{'  ' * level}├─ PID {pid}: {info['name']} - {cmdline}", file=buf)
+            
+            # 检查是否包含SSH
+            if 'ssh' in cmdline.lower():
+                print(f"{'  ' * level}   🔗 发现SSH进程!", file=buf)
+            
+            parent_pid = info['ppid']
+            if not parent_pid or parent_pid == pid:
                 break
+            if parent_pid not in snapshot:
+                print(f"{'  ' * level}├─ 无法访问进程: PID {parent_pid}", file=buf)
+                break
+            pid = parent_pid
+            level += 1
                 
     except Exception as e:
-        print(f"错误: {e}")
+        print(f"错误: {e}", file=buf)
     
-    print("\n" + "=" * 60)
+    print("\n" + "=" * 60, file=buf)
+    
+    # 整份报告一次性输出
+    sys.stdout.write(buf.getvalue())
 
-def debug_all_terminals():
+def debug_all_terminals(snapshot=None):
     """调试所有终端相关进程"""
-    print("📱 所有终端进程分析")
-    print("=" * 60)
+    buf = io.StringIO()
+    print("📱 所有终端进程分析", file=buf)
+    print("=" * 60, file=buf)
+    
+    if snapshot is None:
+        snapshot = snapshot_processes()
     
     terminal_processes = []
     
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-        try:
-            name = proc.info['name']
-            cmdline = proc.info['cmdline'] or []
-            
-            # 查找终端相关进程
-            if (name in ['Terminal', 'iTerm2', 'iTerm', 'bash', 'zsh', 'fish', 'sh', 'ssh'] or
-                any('ssh' in arg for arg in cmdline)):
-                terminal_processes.append((proc.info['pid'], name, ' '.join(cmdline)))
-                
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    for info in snapshot.values():
+        name = info['name']
+        joined = ' '.join(info['cmdline'] or ())
+        
+        # 查找终端相关进程
+        if name in TERMINAL_PROCESS_NAMES or SSH_PATTERN.search(joined):
+            terminal_processes.append((info['pid'], name, joined))
     
     # 按进程名分组显示
     terminal_processes.sort(key=lambda x: x[1])
@@ -77,15 +95,18 @@ def debug_all_terminals():
     current_group = None
     for pid, name, cmdline in terminal_processes:
         if name != current_group:
-            print(f"\n📁 {name} 进程:")
+            print(f"\n📁 {name} 进程:", file=buf)
             current_group = name
-        print(f"  PID {pid}: {cmdline}")
+        print(f"  PID {pid}: {cmdline}", file=buf)
         
         # 特殊标记SSH进程
         if 'ssh' in cmdline.lower():
-            print(f"    🔗 SSH连接进程")
+            print(f"    🔗 SSH连接进程", file=buf)
     
-    print("\n" + "=" * 60)
+    print("\n" + "=" * 60, file=buf)
+    
+    # 整份报告一次性输出
+    sys.stdout.write(buf.getvalue())
 
 def debug_ssh_env():
     """调试SSH相关环境变量"""
@@ -114,9 +135,12 @@ def main():
     print("=" * 60)
     print()
     
-    debug_current_process_tree()
+    # 两个分析共用同一份进程快照
+    snapshot = snapshot_processes()
+    
+    debug_current_process_tree(snapshot)
     print()
-    debug_all_terminals()
+    debug_all_terminals(snapshot)
     print()
     debug_ssh_env()
 
@@ -6,6 +6,8 @@ SmartPaste SSH调试脚本
 
 import os
 import sys
+import json
+import posixpath
 import subprocess
 import time
 from pathlib import Path
@@ -16,8 +18,9 @@ sys.path.insert(0, str(Path.home() / '.smartpaste'))
 from terminal_detector import TerminalDetector
 from clipboard_monitor import ClipboardMonitor  
 from keyboard_handler import KeyboardHandler
+from config_manager import SmartPasteConfig
 
-def check_environment():
+def check_environment(config: SmartPasteConfig):
     """检查当前环境"""
     print("🔍 环境检查")
     print("=" * 40)
@@ -45,9 +48,9 @@ def check_environment():
     
     print(f"📱 当前应用: {current_app}")
     
-    # 检查是否是终端应用
-    terminal_apps = ['Terminal', 'iTerm2', 'iTerm', 'Hyper', 'Alacritty', 'Wezterm']
-    is_terminal = current_app in terminal_apps if current_app else False
+    # 检查是否是终端应用（与实际粘贴使用相同的判断）
+    handler = KeyboardHandler(terminal_apps=config.terminal_apps_set)
+    is_terminal = handler.is_terminal_app(current_app) if current_app else False
     print(f"🖥️  是否为终端: {'是' if is_terminal else '否'}")
     
     # 检查SSH连接
@@ -67,24 +70,20 @@ def check_clipboard():
     print("=" * 40)
     
     monitor = ClipboardMonitor()
-    content, is_image = monitor.get_clipboard_content()
-    
-    if content:
-        if is_image:
-            print(f"🖼️  检测到图片: {content}")
-            # 检查文件是否存在
-            if os.path.exists(content):
-                file_size = os.path.getsize(content)
-                print(f"   📏 文件大小: {file_size} bytes")
-            else:
-                print(f"   ❌ 文件不存在")
-        else:
-            print(f"📝 检测到文本: {content[:50]}...")
+    clip_type = monitor.peek_clipboard_type()
+    
+    # 只探测类型，图片不需要为诊断而写入临时文件
+    text = ""
+    if clip_type == 'image':
+        print("🖼️  检测到图片")
+    elif clip_type == 'text':
+        text, _ = monitor.get_clipboard_content()
+        print(f"📝 检测到文本: {text[:50]}...")
     else:
         print("📭 剪贴板为空")
     
     print()
-    return content, is_image
+    return clip_type, text
 
 def check_permissions():
     """检查权限"""
@@ -105,15 +104,28 @@ def check_permissions():
     print()
     return has_permissions
 
-def simulate_paste_event():
+def load_config() -> SmartPasteConfig:
+    """读取已有的配置文件（不存在时使用默认配置，诊断不创建配置文件）"""
+    config = SmartPasteConfig()
+    config_file = Path.home() / '.smartpaste' / 'config.json'
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.apply(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️  读取配置失败，使用默认配置: {e}")
+    return config
+
+def simulate_paste_event(config: SmartPasteConfig):
     """模拟粘贴事件测试"""
     print("🧪 模拟粘贴测试")
     print("=" * 40)
     
     try:
         # 检查环境
-        is_terminal, conn_info = check_environment()
-        content, is_image = check_clipboard()
+        is_terminal, conn_info = check_environment(config)
+        clip_type, text = check_clipboard()
         has_permissions = check_permissions()
         
         if not is_terminal:
@@ -124,24 +136,22 @@ def simulate_paste_event():
             print("❌ 没有辅助功能权限")
             return False
         
-        if not content:
+        if clip_type == 'empty':
             print("❌ 剪贴板为空")
             return False
         
         print("✅ 环境检查通过")
         
-        if is_image:
+        if clip_type == 'image':
+            # 文件名由图片内容哈希决定，诊断时不保存图片，只按配置给出示例路径
+            filename = 'clipboard_image_<时间戳>_<哈希>.png'
             if conn_info['is_ssh']:
                 print(f"🌐 将上传图片到 {conn_info['username']}@{conn_info['hostname']}")
-                # 这里应该进行文件上传测试
-                print("📤 模拟上传...")
-                # 实际的上传逻辑会在这里
-                remote_path = f"/tmp/{os.path.basename(content)}"
-                print(f"✅ 应该粘贴: {remote_path}")
+                print(f"✅ 应该粘贴: {posixpath.join(config.remote_temp_dir, filename)}")
             else:
-                print(f"📁 应该粘贴本地路径: {content}")
+                print(f"📁 应该粘贴本地路径: {os.path.join(config.local_temp_dir, filename)}")
         else:
-            print(f"📝 应该粘贴文本: {content[:50]}...")
+            print(f"📝 应该粘贴文本: {text[:50]}...")
         
         return True
         
@@ -165,7 +175,7 @@ def main():
     print()
     
     # 运行诊断
-    success = simulate_paste_event()
+    success = simulate_paste_event(load_config())
     
     print()
     print("🏁 诊断完成")
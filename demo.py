@@ -37,13 +37,13 @@ def demo_clipboard_monitor():
         
         print("✅ 剪贴板监听器初始化成功")
         
-        # 获取当前剪贴板内容
-        content, is_image = monitor.get_clipboard_content()
-        if content:
-            if is_image:
-                print(f"📸 当前剪贴板内容: 图片 ({content})")
-            else:
-                print(f"📝 当前剪贴板内容: {content[:50]}...")
+        # 探测当前剪贴板内容（图片不写入临时文件）
+        clip_type = monitor.peek_clipboard_type()
+        if clip_type == 'image':
+            print("📸 当前剪贴板内容: 图片")
+        elif clip_type == 'text':
+            content, _ = monitor.get_clipboard_content()
+            print(f"📝 当前剪贴板内容: {content[:50]}...")
         else:
             print("📋 剪贴板为空")
             
@@ -130,7 +130,7 @@ def demo_keyboard_handler():
         # 获取当前应用
         current_app = handler._get_current_app()
         if current_app:
-            is_terminal = any(terminal in current_app for terminal in handler.terminal_apps)
+            is_terminal = handler.is_terminal_app(current_app)
             print(f"🎯 当前应用: {current_app} {'(终端)' if is_terminal else '(非终端)'}")
         
     except ImportError as e:
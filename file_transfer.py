@@ -1,25 +1,188 @@
 #!/usr/bin/env python3
 """
 文件传输模块
-使用SCP协议上传文件到远程服务器
+使用SFTP协议上传文件到远程服务器（可回退到SCP）
 """
 
 import os
+import mmap
+import inspect
+import functools
 import stat
 import time
+import shlex
+import random
 import socket
+import tarfile
+import queue
+import posixpath
+import threading
+import weakref
 from pathlib import Path
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, Tuple, List
 from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import paramiko
-    from paramiko import SSHClient, AutoAddPolicy
-    from scp import SCPClient
+    from paramiko import SSHClient, AutoAddPolicy, SFTPClient
     HAS_PARAMIKO = True
 except ImportError:
     HAS_PARAMIKO = False
-    print("Warning: paramiko and scp not available, install with: pip install paramiko scp")
+    print("Warning: paramiko not available, install with: pip install paramiko")
+
+try:
+    from scp import SCPClient
+    HAS_SCP = True
+except ImportError:
+    HAS_SCP = False
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，无效时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+# SFTP通道的窗口大小和最大包大小，增大窗口以减少等待服务器确认
+# 可按链路RTT通过环境变量调整
+SFTP_WINDOW_SIZE = _env_int('SMARTPASTE_SFTP_WINDOW', 4 * 1024 * 1024)
+SFTP_MAX_PACKET_SIZE = 32768
+
+# 每次写入SFTP文件的块大小（paramiko会拆分为多个并发的写请求）
+SFTP_BLOCK_SIZE = _env_int('SMARTPASTE_SFTP_BLOCK', 256 * 1024)
+
+# 传输套接字的收发缓冲区大小，高延迟高带宽链路上需要足够大才能跑满带宽
+SOCKET_BUFFER_SIZE = _env_int('SMARTPASTE_SOCKET_BUFFER', 4 * 1024 * 1024)
+
+# 上传中的远程文件先写入带此后缀的临时文件，完成后再重命名
+PARTIAL_SUFFIX = '.part'
+
+# 发送多少字节后重新协商密钥（paramiko默认512MB，大文件上传中途会触发重协商）
+SSH_REKEY_BYTES = 2 ** 32
+
+# 加密算法偏好：AES-GCM借助AES-NI一次完成加密和校验，比CTR+HMAC快；不再提供CBC和3DES
+# paramiko不支持的算法（如旧版本没有GCM）会被自动跳过
+PREFERRED_CIPHERS = (
+    'aes128-gcm@openssh.com',
+    'aes256-gcm@openssh.com',
+    'aes128-ctr',
+    'aes256-ctr',
+    'aes192-ctr',
+)
+
+# transport_factory参数需要paramiko 2.12+（requirements要求的3.0+均支持，检查用于更旧的安装）
+_HAS_TRANSPORT_FACTORY = HAS_PARAMIKO and 'transport_factory' in inspect.signature(SSHClient.connect).parameters
+
+def _fast_cipher_transport(sock, **kwargs):
+    """创建按PREFERRED_CIPHERS排列加密算法的Transport，供SSHClient.connect使用"""
+    transport = paramiko.Transport(sock, **kwargs)
+    options = transport.get_security_options()
+    ciphers = tuple(cipher for cipher in PREFERRED_CIPHERS if cipher in options.ciphers)
+    if ciphers:
+        options.ciphers = ciphers
+    return transport
+
+# 读取线程最多领先发送线程的块数，限制预读占用的内存
+SFTP_READ_AHEAD_BLOCKS = 8
+
+@functools.lru_cache(maxsize=64)
+def _expanduser(path: str) -> str:
+    """展开路径中的~（运行期间用户主目录不变，结果可以缓存）"""
+    return os.path.expanduser(path)
+
+# SSH配置解析结果缓存: path -> (mtime, SSHConfig)，文件修改后自动失效
+_SSH_CONFIG_CACHE: Dict[str, Tuple[float, Any]] = {}
+_SSH_CONFIG_LOCK = threading.Lock()
+
+def _load_ssh_config_cached(path: str):
+    """
+    读取SSH配置，同一文件未修改时复用已解析的结果
+    
+    Returns:
+        paramiko.SSHConfig对象，文件不存在时返回None
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+        
+    with _SSH_CONFIG_LOCK:
+        cached = _SSH_CONFIG_CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+            
+        ssh_config = paramiko.SSHConfig.from_path(path)
+        _SSH_CONFIG_CACHE[path] = (mtime, ssh_config)
+        return ssh_config
+
+# known_hosts解析结果缓存: path -> (mtime, HostKeys)，所有SSHClient共享
+_KNOWN_HOSTS_CACHE: Dict[str, Tuple[float, Any]] = {}
+_KNOWN_HOSTS_LOCK = threading.RLock()
+
+def _get_known_hosts(path: str):
+    """
+    读取known_hosts，同一文件未修改时复用已解析的HostKeys
+    
+    Returns:
+        paramiko.HostKeys对象，文件不存在时返回None
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+        
+    with _KNOWN_HOSTS_LOCK:
+        cached = _KNOWN_HOSTS_CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+            
+        host_keys = paramiko.HostKeys()
+        host_keys.load(path)
+        _KNOWN_HOSTS_CACHE[path] = (mtime, host_keys)
+        return host_keys
+
+# 私钥解析结果缓存: path -> (mtime, PKey或None)，重连时不必重新解析密钥文件
+_PRIVATE_KEY_CACHE: Dict[str, Tuple[float, Any]] = {}
+_PRIVATE_KEY_LOCK = threading.Lock()
+
+def _get_private_key(path: str):
+    """
+    读取私钥文件，同一文件未修改时复用已解析的PKey
+    
+    Returns:
+        paramiko.PKey对象，文件不存在、需要密码或无法解析时返回None
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+        
+    with _PRIVATE_KEY_LOCK:
+        cached = _PRIVATE_KEY_CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+            
+        key = None
+        try:
+            if hasattr(paramiko.PKey, 'from_path'):  # paramiko 3.2+ 自动识别密钥类型
+                key = paramiko.PKey.from_path(path)
+            else:
+                for key_class in (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey):
+                    try:
+                        key = key_class.from_private_key_file(path)
+                        break
+                    except paramiko.PasswordRequiredException:
+                        raise
+                    except paramiko.SSHException:
+                        continue
+        except Exception:
+            # 加密（需要密码）或无法识别的密钥仍以文件路径交给paramiko，由ssh-agent等处理
+            key = None
+            
+        _PRIVATE_KEY_CACHE[path] = (mtime, key)
+        return key
 
 @dataclass
 class TransferResult:
@@ -29,13 +192,117 @@ class TransferResult:
     error_message: str = ""
     transfer_time: float = 0.0
     file_size: int = 0
+    retryable: bool = True  # 失败是否可能通过重试恢复（认证、路径错误等重试无意义）
+
+class _SFTPChannelPool:
+    """单个SSH连接上的SFTP通道池，通道数受服务器MaxSessions限制"""
+    
+    def __init__(self, open_channel: Callable, max_channels: int):
+        self._open_channel = open_channel
+        self._max_channels = max_channels
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        
+    def acquire(self):
+        """获取空闲通道，没有时按需新建，达到上限则等待归还"""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+                
+            with self._lock:
+                can_open = self._created < self._max_channels
+                if can_open:
+                    self._created += 1
+                    
+            if can_open:
+                try:
+                    return self._open_channel()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                        if self._created == 0:
+                            raise
+                        # 服务器拒绝更多会话，以现有通道数作为上限
+                        self._max_channels = self._created
+                        
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+                
+    def release(self, sftp, broken: bool = False):
+        """归还通道，出错的通道直接关闭"""
+        if not broken:
+            self._idle.put(sftp)
+            return
+            
+        with self._lock:
+            self._created -= 1
+        try:
+            sftp.close()
+        except:
+            pass
+            
+    def close(self):
+        """关闭所有空闲通道"""
+        while True:
+            try:
+                sftp = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                sftp.close()
+            except:
+                pass
 
 class FileTransfer:
     """文件传输器类"""
     
-    def __init__(self):
-        """初始化文件传输器"""
+    # SSH保活间隔（秒）
+    KEEPALIVE_INTERVAL = 30
+    
+    # 上传重试的退避参数（秒）
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 30.0
+    
+    # 关闭连接时套接字操作的超时（秒），避免在不稳定的网络上长时间阻塞
+    CLOSE_TIMEOUT = 1.0
+    
+    # 连接池最多保留的主机连接数，超出时关闭最久未使用的连接
+    MAX_POOLED_CONNECTIONS = 4
+    
+    def __init__(self, use_compression: bool = False, use_scp: bool = False,
+                 max_sftp_channels: int = 4):
+        """
+        初始化文件传输器
+        
+        Args:
+            use_compression: 是否启用SSH压缩（文本类文件在慢速链路上可能受益）
+            use_scp: 使用SCP而不是SFTP上传（用于不支持SFTP子系统的服务器）
+            max_sftp_channels: 每个连接最多同时打开的SFTP通道数
+        """
         self.ssh_client = None
+        self.use_compression = use_compression
+        self.use_scp = use_scp
+        self.max_sftp_channels = max(1, max_sftp_channels)
+        
+        # 连接池（按最近使用排序）: (hostname, port, username) -> SSHClient
+        self._pool: 'OrderedDict[Tuple[str, int, str], Any]' = OrderedDict()
+        self._pool_lock = threading.Lock()
+        
+        # 每个连接上的SFTP通道池: SSHClient -> _SFTPChannelPool
+        self._sftp_pools: Dict[Any, _SFTPChannelPool] = {}
+        
+        # 建立每个连接时的_acquire参数，连接断开后重试上传时据此重新连接
+        self._acquire_args: 'weakref.WeakKeyDictionary[Any, Tuple]' = weakref.WeakKeyDictionary()
+        
+        # 对象被回收或解释器退出时关闭残留连接（回调不能引用self）
+        self._finalizer = weakref.finalize(self, FileTransfer._finalize_close,
+                                           self._pool, self._sftp_pools)
+        
         self.known_hosts_path = os.path.expanduser("~/.ssh/known_hosts")
         self.ssh_config_path = os.path.expanduser("~/.ssh/config")
         self.default_key_paths = [
@@ -45,6 +312,9 @@ class FileTransfer:
             "~/.ssh/id_dsa"
         ]
         
+        # 默认密钥在运行期间不会变化，只在初始化时查找一次
+        self._available_keys = self._find_ssh_keys()
+        
     def _get_ssh_config(self, hostname: str) -> Dict[str, Any]:
         """获取SSH配置信息"""
         config = {
@@ -59,11 +329,8 @@ class FileTransfer:
             return config
             
         try:
-            ssh_config = paramiko.SSHConfig()
-            if os.path.exists(self.ssh_config_path):
-                with open(self.ssh_config_path) as f:
-                    ssh_config.parse(f)
-                    
+            ssh_config = _load_ssh_config_cached(self.ssh_config_path)
+            if ssh_config:
                 host_config = ssh_config.lookup(hostname)
                 config.update({
                     'hostname': host_config.get('hostname', hostname),
@@ -75,9 +342,9 @@ class FileTransfer:
                 if 'identityfile' in host_config:
                     identity_files = host_config['identityfile']
                     if isinstance(identity_files, list):
-                        config['key_filename'] = [os.path.expanduser(f) for f in identity_files]
+                        config['key_filename'] = [_expanduser(f) for f in identity_files]
                     else:
-                        config['key_filename'] = os.path.expanduser(identity_files)
+                        config['key_filename'] = _expanduser(identity_files)
                         
         except Exception as e:
             print(f"Error reading SSH config: {e}")
@@ -88,16 +355,38 @@ class FileTransfer:
         """查找可用的SSH密钥"""
         keys = []
         for key_path in self.default_key_paths:
-            expanded_path = os.path.expanduser(key_path)
+            expanded_path = _expanduser(key_path)
             if os.path.exists(expanded_path):
                 keys.append(expanded_path)
         return keys
         
+    def preload_keys(self):
+        """预先解析默认私钥，之后的连接和重连直接使用缓存的PKey"""
+        for key_path in self._available_keys:
+            _get_private_key(key_path)
+            
+    def _key_auth_kwargs(self, key_paths: List[str]) -> Dict[str, Any]:
+        """
+        生成密钥认证参数：第一个可解析的密钥以PKey对象传入，
+        其余（包括加密的）仍以文件路径交给paramiko
+        """
+        kwargs: Dict[str, Any] = {}
+        remaining = []
+        for key_path in key_paths:
+            key = None if 'pkey' in kwargs else _get_private_key(key_path)
+            if key is not None:
+                kwargs['pkey'] = key
+            else:
+                remaining.append(key_path)
+        if remaining:
+            kwargs['key_filename'] = remaining
+        return kwargs
+        
     def connect_ssh(self, hostname: str, username: str, port: int = 22, 
                    password: Optional[str] = None, 
                    key_filename: Optional[str] = None) -> bool:
         """
-        建立SSH连接
+        建立SSH连接（同一主机复用连接池中的已有连接）
         
         Args:
             hostname: 主机地址
@@ -109,25 +398,95 @@ class FileTransfer:
         Returns:
             是否连接成功
         """
+        client = self.get_connection(hostname, username, port, password, key_filename)
+        if client is None:
+            return False
+            
+        self.ssh_client = client
+        return True
+        
+    def get_connection(self, hostname: str, username: str, port: int = 22,
+                       password: Optional[str] = None,
+                       key_filename: Optional[str] = None):
+        """
+        获取到指定主机的SSH连接（同一主机复用连接池中的已有连接）
+        
+        与connect_ssh不同，不修改共享的ssh_client；多个线程同时上传到不同主机时，
+        应使用返回的连接调用upload_file(client=...)
+        
+        Returns:
+            SSHClient对象，连接失败时返回None
+        """
         if not HAS_PARAMIKO:
             print("Error: paramiko not available")
-            return False
+            return None
             
+        return self._acquire(hostname, username, port, password, key_filename)
+        
+    @classmethod
+    def _tune_transport(cls, transport):
+        """调整连接的保活、套接字和窗口参数"""
+        transport.set_keepalive(cls.KEEPALIVE_INTERVAL)
+        
+        # 关闭Nagle算法，避免小的SFTP控制包被延迟合并；加大收发缓冲区
         try:
-            self.ssh_client = SSHClient()
+            sock = transport.sock
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+        except (AttributeError, OSError):
+            pass  # 代理命令等非TCP套接字不支持这些选项
             
-            # 加载已知主机
-            if os.path.exists(self.known_hosts_path):
-                self.ssh_client.load_host_keys(self.known_hosts_path)
+        # 之后打开的通道（exec、SCP）也使用加大的窗口
+        transport.default_window_size = SFTP_WINDOW_SIZE
+        transport.packetizer.REKEY_BYTES = SSH_REKEY_BYTES
+        
+    @staticmethod
+    def _is_alive(client) -> bool:
+        """检查连接是否仍然可用"""
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+        
+    def _acquire(self, hostname: str, username: str, port: int = 22,
+                 password: Optional[str] = None,
+                 key_filename: Optional[str] = None):
+        """
+        从连接池获取SSH连接，没有可用连接时新建并放入连接池
+        
+        Returns:
+            SSHClient对象，连接失败时返回None
+        """
+        # 获取SSH配置
+        config = self._get_ssh_config(hostname)
+        actual_hostname = config['hostname']
+        actual_port = port if port != 22 else config['port']
+        actual_username = username if username != 'unknown' else config['username']
+        pool_key = (actual_hostname, actual_port, actual_username)
+        
+        with self._pool_lock:
+            client = self._pool.get(pool_key)
+            if client is not None:
+                if self._is_alive(client):
+                    self._pool.move_to_end(pool_key)
+                    return client
+                # 连接已断开，丢弃后重建
+                del self._pool[pool_key]
+                sftp_pool = self._sftp_pools.pop(client, None)
+                if sftp_pool:
+                    sftp_pool.close()
+                self._close_client(client)
+                    
+        try:
+            client = SSHClient()
+            
+            # 加载已知主机（复用缓存的解析结果，效果等同于load_host_keys）
+            host_keys = _get_known_hosts(self.known_hosts_path)
+            if host_keys is not None:
+                client._host_keys = host_keys
+                client._host_keys_filename = self.known_hosts_path
                 
             # 自动添加未知主机（在生产环境中应该谨慎使用）
-            self.ssh_client.set_missing_host_key_policy(AutoAddPolicy())
-            
-            # 获取SSH配置
-            config = self._get_ssh_config(hostname)
-            actual_hostname = config['hostname']
-            actual_port = port if port != 22 else config['port']
-            actual_username = username if username != 'unknown' else config['username']
+            client.set_missing_host_key_policy(AutoAddPolicy())
             
             # 尝试连接
             connect_kwargs = {
@@ -136,48 +495,106 @@ class FileTransfer:
                 'username': actual_username,
                 'timeout': 10,
                 'banner_timeout': 10,
-                'auth_timeout': 10
+                'auth_timeout': 10,
+                'compress': self.use_compression
             }
+            if _HAS_TRANSPORT_FACTORY:
+                connect_kwargs['transport_factory'] = _fast_cipher_transport
             
-            # 优先使用提供的密钥或密码
-            if key_filename and os.path.exists(os.path.expanduser(key_filename)):
-                connect_kwargs['key_filename'] = os.path.expanduser(key_filename)
+            # 优先使用提供的密钥或密码，其次SSH配置中的IdentityFile，最后是默认密钥；
+            # 密钥使用缓存的PKey对象，失败后再尝试SSH Agent
+            connect_kwargs['allow_agent'] = True
+            connect_kwargs['look_for_keys'] = True
+            if key_filename and os.path.exists(_expanduser(key_filename)):
+                connect_kwargs.update(self._key_auth_kwargs([_expanduser(key_filename)]))
             elif password:
                 connect_kwargs['password'] = password
             elif config.get('key_filename'):
-                connect_kwargs['key_filename'] = config['key_filename']
-            else:
-                # 尝试所有可用密钥
-                keys = self._find_ssh_keys()
-                if keys:
-                    connect_kwargs['key_filename'] = keys
-                    
-            # 尝试SSH Agent
-            try:
-                connect_kwargs['allow_agent'] = True
-                connect_kwargs['look_for_keys'] = True
-            except:
-                pass
+                identity_files = config['key_filename']
+                if isinstance(identity_files, str):
+                    identity_files = [identity_files]
+                connect_kwargs.update(self._key_auth_kwargs(identity_files))
+            elif self._available_keys:
+                connect_kwargs.update(self._key_auth_kwargs(self._available_keys))
+                # 默认密钥已全部提供，不必让paramiko再次扫描~/.ssh
+                connect_kwargs['look_for_keys'] = False
                 
-            self.ssh_client.connect(**connect_kwargs)
-            print(f"SSH connected to {actual_username}@{actual_hostname}:{actual_port}")
-            return True
+            client.connect(**connect_kwargs)
+            transport = client.get_transport()
+            self._tune_transport(transport)
+            print(f"SSH connected to {actual_username}@{actual_hostname}:{actual_port} "
+                  f"(cipher: {transport.local_cipher})")
             
         except paramiko.AuthenticationException:
             print("SSH authentication failed")
-            return False
+            return None
         except paramiko.SSHException as e:
             print(f"SSH connection error: {e}")
-            return False
+            return None
         except socket.error as e:
             print(f"Network error: {e}")
-            return False
+            return None
         except Exception as e:
             print(f"Unexpected error connecting to SSH: {e}")
-            return False
+            return None
+            
+        evicted = []
+        with self._pool_lock:
+            existing = self._pool.get(pool_key)
+            if existing is not None and self._is_alive(existing):
+                # 其他线程已经建立了连接，使用已有连接
+                client.close()
+                return existing
+            if existing is not None:
+                evicted.append(existing)
+            self._pool[pool_key] = client
+            self._pool.move_to_end(pool_key)
+            self._acquire_args[client] = (hostname, username, port, password, key_filename)
+            
+            # 超出上限时淘汰最久未使用的连接
+            while len(self._pool) > self.MAX_POOLED_CONNECTIONS:
+                _, old_client = self._pool.popitem(last=False)
+                evicted.append(old_client)
+            for old_client in evicted:
+                sftp_pool = self._sftp_pools.pop(old_client, None)
+                if sftp_pool:
+                    sftp_pool.close()
+                    
+        for old_client in evicted:
+            self._close_client(old_client)
             
+        return client
+            
+    def _evict(self, client):
+        """将已断开的连接移出连接池并关闭，下次获取时重新连接"""
+        with self._pool_lock:
+            for pool_key, pooled in list(self._pool.items()):
+                if pooled is client:
+                    del self._pool[pool_key]
+            sftp_pool = self._sftp_pools.pop(client, None)
+            
+        if sftp_pool:
+            sftp_pool.close()
+        self._close_client(client)
+        
+    def _reacquire(self, client):
+        """
+        获取与client相同目标的可用连接：client仍在连接池中且可用时直接返回，
+        否则按建立client时的参数重新连接
+        
+        Returns:
+            SSHClient对象，重新连接失败时返回None
+        """
+        args = self._acquire_args.get(client)
+        if args is None:
+            return client  # 不是由连接池建立的连接，无法重新连接
+        return self._acquire(*args)
+        
     def upload_file(self, local_path: str, remote_path: str, 
-                   progress_callback: Optional[Callable] = None) -> TransferResult:
+                   progress_callback: Optional[Callable] = None,
+                   pipelined: bool = True,
+                   local_stat: Optional[os.stat_result] = None,
+                   client=None) -> TransferResult:
         """
         上传文件到远程服务器
         
@@ -185,44 +602,51 @@ class FileTransfer:
             local_path: 本地文件路径
             remote_path: 远程文件路径
             progress_callback: 进度回调函数
+            pipelined: SFTP写入是否流水线化（不逐块等待服务器确认）
+            local_stat: 调用方已获取的本地文件stat结果，提供时不再重复stat
+            client: 使用的SSH连接（get_connection的返回值），默认为connect_ssh建立的连接
             
         Returns:
             TransferResult对象
         """
-        if not self.ssh_client:
-            return TransferResult(success=False, error_message="No SSH connection")
+        if client is None:
+            client = self.ssh_client
+        if not client:
+            return TransferResult(success=False, error_message="No SSH connection", retryable=False)
+            
+        # 一次stat同时完成存在性、类型和大小检查
+        try:
+            if local_stat is None:
+                local_stat = os.stat(local_path)
+        except FileNotFoundError:
+            return TransferResult(success=False, error_message=f"Local file not found: {local_path}",
+                                  retryable=False)
+        except OSError as e:
+            return TransferResult(success=False, error_message=f"Cannot access local file: {e}",
+                                  retryable=False)
             
-        if not os.path.exists(local_path):
-            return TransferResult(success=False, error_message=f"Local file not found: {local_path}")
+        if not stat.S_ISREG(local_stat.st_mode):
+            return TransferResult(success=False, error_message=f"Not a regular file: {local_path}",
+                                  retryable=False)
             
         try:
             start_time = time.time()
-            file_size = os.path.getsize(local_path)
+            file_size = local_stat.st_size
             
             def progress_wrapper(filename, size, sent):
                 if progress_callback:
                     progress_callback(filename, size, sent)
                     
-            # 创建SCP客户端
-            with SCPClient(self.ssh_client.get_transport(), progress=progress_wrapper) as scp:
-                # 确保远程目录存在
-                remote_dir = os.path.dirname(remote_path)
-                if remote_dir:
-                    try:
-                        self.ssh_client.exec_command(f"mkdir -p {remote_dir}")
-                    except:
-                        pass  # 目录可能已存在
-                        
-                # 上传文件
-                scp.put(local_path, remote_path)
+            # 上传并验证文件
+            if self.use_scp:
+                verified = self._upload_scp(client, local_path, remote_path, progress_wrapper)
+            else:
+                verified = self._upload_sftp(client, local_path, remote_path, file_size,
+                                             progress_wrapper, pipelined)
                 
             transfer_time = time.time() - start_time
             
-            # 验证文件是否上传成功
-            stdin, stdout, stderr = self.ssh_client.exec_command(f"test -f {remote_path} && echo 'OK'")
-            result = stdout.read().decode().strip()
-            
-            if result == 'OK':
+            if verified:
                 print(f"File uploaded successfully: {remote_path}")
                 return TransferResult(
                     success=True, 
@@ -231,14 +655,362 @@ class FileTransfer:
                     file_size=file_size
                 )
             else:
-                return TransferResult(success=False, error_message="Upload verification failed")
+                return TransferResult(success=False, error_message="Upload verification failed",
+                                      retryable=False)
+                
+        except Exception as e:
+            if self._is_transport_error(client, e):
+                # 连接已失效，移出连接池，重试时重新连接
+                self._evict(client)
+            return TransferResult(success=False, error_message=f"Upload failed: {str(e)}",
+                                  retryable=self._is_retryable_error(e))
+            
+    @staticmethod
+    def _is_transport_error(client, error: Exception) -> bool:
+        """判断异常是否意味着SSH连接本身已失效"""
+        # socket.error即OSError，SFTP状态错误（FileNotFoundError/PermissionError等）也是其子类，
+        # 不能据此判断连接失效，只认传输层异常或传输已断开
+        if isinstance(error, (paramiko.SSHException, EOFError, socket.timeout, ConnectionError)):
+            return True
+        transport = client.get_transport() if client else None
+        return transport is None or not transport.is_active()
+            
+    @staticmethod
+    def _is_retryable_error(error: Exception) -> bool:
+        """判断上传异常是否为临时性错误"""
+        # 认证失败、路径不存在、权限不足等永久性错误重试只会浪费SSH握手
+        if isinstance(error, (paramiko.AuthenticationException, FileNotFoundError,
+                              PermissionError, IsADirectoryError)):
+            return False
+        return True
+            
+    @staticmethod
+    def _open_sftp(client):
+        """在指定连接上打开一个加大窗口的SFTP通道"""
+        return SFTPClient.from_transport(
+            client.get_transport(),
+            window_size=SFTP_WINDOW_SIZE,
+            max_packet_size=SFTP_MAX_PACKET_SIZE
+        )
+        
+    def _channel_pool(self, client) -> _SFTPChannelPool:
+        """获取连接对应的SFTP通道池"""
+        with self._pool_lock:
+            sftp_pool = self._sftp_pools.get(client)
+            if sftp_pool is None:
+                sftp_pool = _SFTPChannelPool(functools.partial(self._open_sftp, client),
+                                             self.max_sftp_channels)
+                self._sftp_pools[client] = sftp_pool
+            return sftp_pool
+        
+    @staticmethod
+    def _sftp_makedirs(sftp, remote_dir: str):
+        """逐级创建远程目录（等同于mkdir -p）"""
+        try:
+            sftp.stat(remote_dir)
+            return  # 目录已存在
+        except IOError:
+            pass
+            
+        current = '/' if remote_dir.startswith('/') else ''
+        for part in remote_dir.split('/'):
+            if not part:
+                continue
+            current = posixpath.join(current, part) if current else part
+            try:
+                sftp.stat(current)
+            except IOError:
+                sftp.mkdir(current)
                 
+    def _upload_sftp(self, client, local_path: str, remote_path: str, file_size: int,
+                     progress_wrapper: Callable, pipelined: bool = True) -> bool:
+        """
+        通过SFTP上传文件
+        
+        先写入remote_path.part，核对无误后再原子重命名为remote_path，
+        路径已粘贴到终端时，用户不会读到写了一半的文件
+        
+        Returns:
+            远程文件是否为大小一致的普通文件
+        """
+        filename = os.path.basename(local_path)
+        part_path = remote_path + PARTIAL_SUFFIX
+        
+        def sftp_progress(sent, size):
+            progress_wrapper(filename, size, sent)
+            
+        sftp_pool = self._channel_pool(client)
+        sftp = sftp_pool.acquire()
+        broken = False
+        try:
+            # 确保远程目录存在
+            remote_dir = posixpath.dirname(remote_path)
+            if remote_dir:
+                self._sftp_makedirs(sftp, remote_dir)
+                
+            # 流水线写入：不逐个等待服务器确认，让多个写请求同时在途（close时统一等待确认）
+            with open(local_path, 'rb') as f, sftp.open(part_path, 'wb') as remote_file:
+                remote_file.set_pipelined(pipelined)
+                if file_size:
+                    self._write_mapped(f, remote_file, sftp_progress)
+                    
+            # 关闭文件时会等待所有写请求确认，再在同一通道上核对远程文件
+            remote_stat = sftp.stat(part_path)
+            if not (stat.S_ISREG(remote_stat.st_mode) and remote_stat.st_size == file_size):
+                self._sftp_remove_quietly(sftp, part_path)
+                return False
+                
+            self._sftp_replace(sftp, part_path, remote_path)
+            return True
+        except Exception as e:
+            if self._is_transport_error(client, e):
+                broken = True  # 通道已不可用，不再放回通道池
+            else:
+                # 远程路径/权限等SFTP状态错误不影响通道本身，清理临时文件后照常归还
+                self._sftp_remove_quietly(sftp, part_path)
+            raise
+        finally:
+            sftp_pool.release(sftp, broken)
+            
+    @staticmethod
+    def _sftp_replace(sftp, source: str, target: str):
+        """重命名远程文件并覆盖已有目标（服务器不支持posix-rename扩展时先删除目标）"""
+        try:
+            sftp.posix_rename(source, target)
+        except IOError:
+            try:
+                sftp.remove(target)
+            except IOError:
+                pass
+            sftp.rename(source, target)
+            
+    @staticmethod
+    def _sftp_remove_quietly(sftp, remote_path: str):
+        """删除远程文件，忽略错误"""
+        try:
+            sftp.remove(remote_path)
+        except Exception:
+            pass
+            
+    @staticmethod
+    def _write_mapped(local_file, remote_file, progress: Callable):
+        """
+        将本地文件映射到内存后分块写入SFTP
+        
+        读取线程提前把后续块的页面载入内存，经有界队列交给当前线程发送，
+        使磁盘读取与加密发送重叠进行
+        """
+        mapped = mmap.mmap(local_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        total = len(view)
+        chunks = queue.Queue(maxsize=SFTP_READ_AHEAD_BLOCKS)
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+            
+        def reader():
+            try:
+                for offset in range(0, total, SFTP_BLOCK_SIZE):
+                    chunk = view[offset:offset + SFTP_BLOCK_SIZE]
+                    chunk[::mmap.PAGESIZE].tobytes()  # 每页读一个字节，触发缺页从磁盘载入
+                    if not put(chunk):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+                
+        reader_thread = threading.Thread(target=reader, daemon=True)
+        reader_thread.start()
+        chunk = None
+        try:
+            sent = 0
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                remote_file.write(chunk)
+                sent += len(chunk)
+                progress(sent, total)
+        finally:
+            stop.set()
+            reader_thread.join()
+            
+            # 丢弃未发送的块，释放对映射内存的引用后才能关闭映射
+            chunk = None
+            while not chunks.empty():
+                chunks.get_nowait()
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 异常回溯仍引用着某个块，映射会在块被回收后释放
+                
+    def _upload_scp(self, client, local_path: str, remote_path: str,
+                    progress_wrapper: Callable) -> bool:
+        """
+        通过SCP上传文件（备用方式）
+        
+        Returns:
+            远程文件是否存在
+        """
+        if not HAS_SCP:
+            raise RuntimeError("scp not available, install with: pip install scp")
+            
+        # 创建SCP客户端
+        with SCPClient(client.get_transport(), progress=progress_wrapper) as scp:
+            # 确保远程目录存在
+            remote_dir = posixpath.dirname(remote_path)
+            if remote_dir:
+                try:
+                    client.exec_command(f"mkdir -p {shlex.quote(remote_dir)}")
+                except:
+                    pass  # 目录可能已存在
+                    
+            # 上传到临时文件
+            part_path = remote_path + PARTIAL_SUFFIX
+            scp.put(local_path, part_path)
+            
+        # 没有SFTP通道可用，通过命令将临时文件重命名为目标文件并验证
+        part_arg, remote_arg = shlex.quote(part_path), shlex.quote(remote_path)
+        stdin, stdout, stderr = client.exec_command(
+            f"mv -f -- {part_arg} {remote_arg} && test -f {remote_arg} && echo 'OK'"
+        )
+        return stdout.read().decode().strip() == 'OK'
+        
+    def upload_many(self, local_paths: List[str], remote_base_dir: str = "/tmp",
+                    progress_callback: Optional[Callable] = None,
+                    client=None) -> List[TransferResult]:
+        """
+        通过多个SFTP通道并发上传多个文件到当前连接的主机
+        
+        Args:
+            local_paths: 本地文件路径列表
+            remote_base_dir: 远程基础目录
+            progress_callback: 进度回调函数
+            client: 使用的SSH连接，默认为connect_ssh建立的连接
+            
+        Returns:
+            与local_paths顺序一致的TransferResult列表
+        """
+        if not local_paths:
+            return []
+            
+        if client is None:
+            client = self.ssh_client
+            
+        workers = min(self.max_sftp_channels, len(local_paths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    self.upload_file, local_path,
+                    self.generate_remote_path(local_path, remote_base_dir),
+                    progress_callback, client=client
+                )
+                for local_path in local_paths
+            ]
+            return [future.result() for future in futures]
+            
+    def upload_batch_tar(self, local_paths: List[str],
+                         remote_base_dir: str = "/tmp",
+                         client=None) -> List[TransferResult]:
+        """
+        将多个文件打包为tar流，通过一个exec通道上传并在远程解包
+        
+        适合大量小文件：只需一次往返建立通道，避免逐个文件的SFTP打开/关闭开销
+        
+        Args:
+            local_paths: 本地文件路径列表
+            remote_base_dir: 远程基础目录
+            client: 使用的SSH连接，默认为connect_ssh建立的连接
+            
+        Returns:
+            与local_paths顺序一致的TransferResult列表
+        """
+        if not local_paths:
+            return []
+            
+        if client is None:
+            client = self.ssh_client
+        if not client:
+            return [TransferResult(success=False, error_message="No SSH connection", retryable=False)
+                    for _ in local_paths]
+                    
+        # 先检查本地文件，无效的文件单独报告失败，不影响其他文件
+        results: List[Optional[TransferResult]] = [None] * len(local_paths)
+        batch = []
+        for index, local_path in enumerate(local_paths):
+            try:
+                local_stat = os.stat(local_path)
+            except OSError:
+                results[index] = TransferResult(success=False, retryable=False,
+                                                error_message=f"Local file not found: {local_path}")
+                continue
+            if not stat.S_ISREG(local_stat.st_mode):
+                results[index] = TransferResult(success=False, retryable=False,
+                                                error_message=f"Not a regular file: {local_path}")
+                continue
+            batch.append((index, local_path, local_stat.st_size))
+            
+        if not batch:
+            return results
+            
+        start_time = time.time()
+        remote_dir = shlex.quote(remote_base_dir)
+        command = f"mkdir -p {remote_dir} && tar --no-same-owner -xf - -C {remote_dir}"
+        
+        try:
+            stdin, stdout, stderr = client.exec_command(command)
+            with tarfile.open(fileobj=stdin, mode='w|', bufsize=SFTP_BLOCK_SIZE) as tar:
+                for _, local_path, _ in batch:
+                    tar.add(local_path, arcname=os.path.basename(local_path), recursive=False)
+            stdin.close()  # 发送EOF，远程tar读完后退出
+            
+            exit_status = stdout.channel.recv_exit_status()
+            error_output = stderr.read().decode(errors='replace').strip()
+            
+            if exit_status == 0:
+                error_message = ""
+            else:
+                error_message = f"Remote tar failed ({exit_status}): {error_output}"
+            retryable = False
         except Exception as e:
-            return TransferResult(success=False, error_message=f"Upload failed: {str(e)}")
+            error_message = f"Upload failed: {str(e)}"
+            retryable = self._is_retryable_error(e)
             
+        transfer_time = time.time() - start_time
+        
+        for index, local_path, file_size in batch:
+            if error_message:
+                results[index] = TransferResult(success=False, error_message=error_message,
+                                                retryable=retryable)
+            else:
+                results[index] = TransferResult(
+                    success=True,
+                    remote_path=self.generate_remote_path(local_path, remote_base_dir),
+                    transfer_time=transfer_time,
+                    file_size=file_size
+                )
+                
+        if not error_message:
+            print(f"Uploaded {len(batch)} files to {remote_base_dir}")
+            
+        return results
+        
     def upload_file_with_retry(self, local_path: str, remote_path: str, 
                               max_retries: int = 3,
-                              progress_callback: Optional[Callable] = None) -> TransferResult:
+                              progress_callback: Optional[Callable] = None,
+                              pipelined: bool = True,
+                              local_stat: Optional[os.stat_result] = None,
+                              client=None) -> TransferResult:
         """
         带重试的文件上传
         
@@ -247,21 +1019,43 @@ class FileTransfer:
             remote_path: 远程文件路径
             max_retries: 最大重试次数
             progress_callback: 进度回调函数
+            pipelined: SFTP写入是否流水线化
+            local_stat: 调用方已获取的本地文件stat结果
+            client: 使用的SSH连接，默认为connect_ssh建立的连接
             
         Returns:
             TransferResult对象
         """
         last_error = ""
-        
+        use_shared_client = client is None
+        if use_shared_client:
+            client = self.ssh_client
+            
         for attempt in range(max_retries + 1):
             if attempt > 0:
-                print(f"Retrying upload (attempt {attempt + 1}/{max_retries + 1})...")
-                time.sleep(1)  # 等待1秒后重试
+                # 指数退避加随机抖动，避免触发服务器的连接频率限制
+                delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                delay *= 0.5 + random.random()
+                print(f"Retrying upload in {delay:.1f}s (attempt {attempt + 1}/{max_retries + 1})...")
+                time.sleep(delay)
                 
-            result = self.upload_file(local_path, remote_path, progress_callback)
+                # 上次失败时连接已断开的话重新连接，不在失效的连接上重试
+                if client is not None:
+                    new_client = self._reacquire(client)
+                    if new_client is None:
+                        last_error = "SSH reconnection failed"
+                        continue
+                    if use_shared_client and self.ssh_client is client:
+                        self.ssh_client = new_client
+                    client = new_client
+                    
+            result = self.upload_file(local_path, remote_path, progress_callback, pipelined,
+                                      local_stat, client)
             
             if result.success:
                 return result
+            elif not result.retryable:
+                return result
             else:
                 last_error = result.error_message
                 
@@ -281,24 +1075,52 @@ class FileTransfer:
         filename = os.path.basename(local_path)
         return os.path.join(remote_base_dir, filename).replace('\\', '/')
         
-    def close(self):
-        """关闭SSH连接"""
-        if self.ssh_client:
-            try:
-                self.ssh_client.close()
+    def close_all(self):
+        """关闭连接池中的所有SSH连接"""
+        with self._pool_lock:
+            clients = list(self._pool.values())
+            sftp_pools = list(self._sftp_pools.values())
+            self._pool.clear()
+            self._sftp_pools.clear()
+            
+        for sftp_pool in sftp_pools:
+            sftp_pool.close()
+            
+        for client in clients:
+            if self._close_client(client):
                 print("SSH connection closed")
-            except:
-                pass
-            finally:
-                self.ssh_client = None
                 
-    def __del__(self):
-        """析构函数"""
-        self.close()
+        self.ssh_client = None
+        
+    def close(self):
+        """关闭SSH连接（等同于close_all）"""
+        self.close_all()
+        
+    @classmethod
+    def _close_client(cls, client) -> bool:
+        """关闭SSH连接，套接字操作设置超时以限制阻塞时间"""
+        try:
+            transport = client.get_transport()
+            if transport is not None and transport.sock is not None:
+                transport.sock.settimeout(cls.CLOSE_TIMEOUT)
+            client.close()
+            return True
+        except:
+            return False
+            
+    @staticmethod
+    def _finalize_close(pool: Dict, sftp_pools: Dict):
+        """weakref.finalize回调：关闭未显式关闭的通道和连接"""
+        for sftp_pool in list(sftp_pools.values()):
+            sftp_pool.close()
+        for client in list(pool.values()):
+            FileTransfer._close_client(client)
+        sftp_pools.clear()
+        pool.clear()
         
     def test_connection(self, hostname: str, username: str, port: int = 22) -> bool:
         """
-        测试SSH连接
+        测试SSH连接（连接成功后保留在连接池中供后续上传复用）
         
         Args:
             hostname: 主机地址
@@ -308,10 +1130,7 @@ class FileTransfer:
         Returns:
             是否连接成功
         """
-        if self.connect_ssh(hostname, username, port):
-            self.close()
-            return True
-        return False
+        return self.connect_ssh(hostname, username, port)
 
 
 def test_file_transfer():
@@ -366,7 +1185,7 @@ def test_file_transfer():
             else:
                 print(f"✗ Upload failed: {result.error_message}")
                 
-            transfer.close()
+            transfer.close_all()
         else:
             print("✗ Failed to establish SSH connection")
     else:
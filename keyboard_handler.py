@@ -6,25 +6,238 @@
 
 import os
 import time
+import hashlib
 import subprocess
 import threading
-from typing import Optional, Callable, Set
+from typing import Optional, Callable, Dict
 from enum import Enum
 
-try:
-    from pynput import keyboard
-    from pynput.keyboard import Key, KeyCode
-    HAS_PYNPUT = True
-except ImportError:
-    HAS_PYNPUT = False
-    print("Warning: pynput not available, install with: pip install pynput")
-
 try:
     import pyperclip
     HAS_PYPERCLIP = True
 except ImportError:
     HAS_PYPERCLIP = False
 
+# pynput和PyObjC导入开销较大（pynput在macOS上也会导入Quartz），
+# 延迟到首次开始监听或发送按键时再加载
+HAS_PYNPUT = None
+HAS_QUARTZ = None
+_import_lock = threading.Lock()
+
+def _lazy_pynput() -> bool:
+    """首次调用时导入pynput并缓存到模块全局变量，返回是否可用"""
+    global HAS_PYNPUT, keyboard, Key, KeyCode
+    
+    if HAS_PYNPUT is not None:
+        return HAS_PYNPUT
+        
+    with _import_lock:
+        if HAS_PYNPUT is None:
+            try:
+                from pynput import keyboard
+                from pynput.keyboard import Key, KeyCode
+                HAS_PYNPUT = True
+            except ImportError:
+                HAS_PYNPUT = False
+                print("Warning: pynput not available, install with: pip install pynput")
+        return HAS_PYNPUT
+        
+def _lazy_quartz() -> bool:
+    """
+    首次调用时导入Quartz/AppKit相关符号并缓存到模块全局变量，返回是否可用
+    
+    通过PyObjC直接调用系统API，避免每次都启动osascript子进程
+    """
+    global HAS_QUARTZ, Quartz, NSWorkspace, NSWorkspaceDidActivateApplicationNotification
+    global NSPasteboard, NSPasteboardItem, NSPasteboardTypeString
+    
+    if HAS_QUARTZ is not None:
+        return HAS_QUARTZ
+        
+    with _import_lock:
+        if HAS_QUARTZ is None:
+            try:
+                import Quartz
+                from AppKit import NSWorkspace, NSWorkspaceDidActivateApplicationNotification
+                from AppKit import NSPasteboard, NSPasteboardItem, NSPasteboardTypeString
+                HAS_QUARTZ = True
+            except ImportError:
+                HAS_QUARTZ = False
+        return HAS_QUARTZ
+
+# 虚拟键码kVK_ANSI_V
+_KEYCODE_V = 9
+
+# 写入自己合成的键盘事件的kCGEventSourceUserData，事件监听时据此放行，避免拦截自己发出的Cmd+V
+_SYNTHETIC_EVENT_MARK = 0x534d5450
+
+# CGEventKeyboardSetUnicodeString单个事件最多携带20个UTF-16字符，
+# 按码点切分时取一半以容纳代理对
+_UNICODE_CHUNK = 10
+
+_FRONT_APP_SCRIPT = '''
+tell application "System Events"
+    set frontApp to name of first application process whose frontmost is true
+end tell
+return frontApp
+'''
+
+_NATIVE_PASTE_SCRIPT = '''
+tell application "System Events"
+    keystroke "v" using command down
+end tell
+'''
+
+# 文本通过run处理器的参数传入，脚本本身保持不变，无需对文本做转义
+_KEYSTROKE_SCRIPT = '''
+on run argv
+    tell application "System Events"
+        keystroke (item 1 of argv)
+    end tell
+end run
+'''
+
+_ITERM_WRITE_SCRIPT = '''
+on run argv
+    tell application "iTerm2"
+        tell current session of current tab of current window
+            write text (item 1 of argv)
+        end tell
+    end tell
+end run
+'''
+
+_TERMINAL_DO_SCRIPT = '''
+on run argv
+    tell application "Terminal"
+        do script (item 1 of argv) in selected tab of front window
+    end tell
+end run
+'''
+
+# osacompile预编译脚本的存放目录，及 脚本名 -> 编译结果路径（编译失败为None）
+_SCRIPT_CACHE_DIR = os.path.expanduser("~/.smartpaste/scripts")
+_compiled_scripts: Dict[str, Optional[str]] = {}
+_compiled_lock = threading.Lock()
+
+def _compiled_script_path(name: str, source: str) -> Optional[str]:
+    """获取预编译脚本路径，首次使用时通过osacompile编译，失败时返回None"""
+    with _compiled_lock:
+        if name in _compiled_scripts:
+            return _compiled_scripts[name]
+            
+        # 文件名包含源码摘要，脚本内容修改后自动重新编译
+        digest = hashlib.blake2b(source.encode(), digest_size=4).hexdigest()
+        path = os.path.join(_SCRIPT_CACHE_DIR, f"{name}-{digest}.scpt")
+        if not os.path.exists(path):
+            try:
+                os.makedirs(_SCRIPT_CACHE_DIR, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                result = subprocess.run(['osacompile', '-o', tmp_path], input=source,
+                                        capture_output=True, text=True, timeout=10)
+                if result.returncode == 0:
+                    os.replace(tmp_path, path)
+                else:
+                    path = None
+            except Exception as e:
+                print(f"Error compiling AppleScript {name}: {e}")
+                path = None
+                
+        _compiled_scripts[name] = path
+        return path
+        
+def _run_applescript(name: str, source: str, *args: str, timeout: float = 5,
+                     capture_output: bool = False) -> subprocess.CompletedProcess:
+    """
+    运行AppleScript，优先使用预编译版本以跳过每次调用时的编译
+    
+    Args:
+        name: 脚本名称，用作预编译缓存的键
+        source: 脚本源码
+        args: 传给run处理器的参数
+        timeout: 超时时间（秒）
+        capture_output: 是否捕获输出
+    """
+    path = _compiled_script_path(name, source)
+    if path:
+        return subprocess.run(['osascript', path, *args],
+                              capture_output=capture_output, text=True, timeout=timeout)
+    # 编译不可用时从标准输入读取脚本源码
+    return subprocess.run(['osascript', '-', *args], input=source,
+                          capture_output=capture_output, text=True, timeout=timeout)
+
+class _EventTapListener(threading.Thread):
+    """基于Quartz CGEventTap的Cmd+V监听器，只订阅按键按下事件，且只有Cmd+V进入回调"""
+    
+    def __init__(self, on_cmd_v: Callable[[], bool]):
+        """
+        Args:
+            on_cmd_v: Cmd+V回调，返回True时吞掉该按键事件
+        """
+        super().__init__(daemon=True)
+        self._on_cmd_v = on_cmd_v
+        self._tap = None
+        self._run_loop = None
+        self._ready = threading.Event()
+        self.running = False
+        
+    def run(self):
+        self._tap = Quartz.CGEventTapCreate(
+            Quartz.kCGSessionEventTap,
+            Quartz.kCGHeadInsertEventTap,
+            Quartz.kCGEventTapOptionDefault,
+            Quartz.CGEventMaskBit(Quartz.kCGEventKeyDown),
+            self._callback,
+            None
+        )
+        if self._tap is None:
+            # 通常是缺少辅助功能权限
+            self._ready.set()
+            return
+            
+        source = Quartz.CFMachPortCreateRunLoopSource(None, self._tap, 0)
+        self._run_loop = Quartz.CFRunLoopGetCurrent()
+        Quartz.CFRunLoopAddSource(self._run_loop, source, Quartz.kCFRunLoopCommonModes)
+        Quartz.CGEventTapEnable(self._tap, True)
+        
+        self.running = True
+        self._ready.set()
+        Quartz.CFRunLoopRun()
+        self.running = False
+        
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        """等待事件监听安装完成，返回是否安装成功"""
+        self._ready.wait(timeout)
+        return self.running
+        
+    def stop(self):
+        """停止监听"""
+        if self._tap is not None:
+            Quartz.CGEventTapEnable(self._tap, False)
+        if self._run_loop is not None:
+            Quartz.CFRunLoopStop(self._run_loop)
+            
+    def _callback(self, proxy, event_type, event, refcon):
+        """事件回调，返回None表示吞掉事件"""
+        # 回调超时或用户输入会导致系统禁用事件监听，需要重新启用
+        if event_type in (Quartz.kCGEventTapDisabledByTimeout, Quartz.kCGEventTapDisabledByUserInput):
+            Quartz.CGEventTapEnable(self._tap, True)
+            return event
+            
+        if Quartz.CGEventGetIntegerValueField(event, Quartz.kCGKeyboardEventKeycode) != _KEYCODE_V:
+            return event
+        if not Quartz.CGEventGetFlags(event) & Quartz.kCGEventFlagMaskCommand:
+            return event
+        if Quartz.CGEventGetIntegerValueField(event, Quartz.kCGEventSourceUserData) == _SYNTHETIC_EVENT_MARK:
+            return event
+            
+        try:
+            if self._on_cmd_v():
+                return None
+        except Exception as e:
+            print(f"Error in event tap callback: {e}")
+        return event
+
 class PasteMode(Enum):
     """粘贴模式枚举"""
     NORMAL = "normal"  # 正常文本粘贴
@@ -35,33 +248,56 @@ class PasteMode(Enum):
 class KeyboardHandler:
     """键盘处理器类"""
     
-    def __init__(self, paste_callback: Optional[Callable] = None):
+    # 当前活跃应用名称的缓存有效期（秒）
+    APP_CACHE_TTL = 0.25
+    
+    # 主线程运行循环每次运行的时长（秒），返回后检查停止事件并处理Python信号
+    MAIN_LOOP_SLICE = 0.5
+    
+    # 未传入配置时使用的终端应用名
+    DEFAULT_TERMINAL_APPS = frozenset({'Terminal', 'iTerm2', 'iTerm', 'Hyper', 'Alacritty', 'WezTerm', 'Warp'})
+    
+    def __init__(self, paste_callback: Optional[Callable] = None,
+                 terminal_apps: Optional[frozenset] = None):
         """
         初始化键盘处理器
         
         Args:
             paste_callback: 粘贴回调函数，参数为(content, is_image, is_ssh)
+            terminal_apps: 终端应用名集合（通常为config.terminal_apps_set），默认DEFAULT_TERMINAL_APPS
         """
         self.paste_callback = paste_callback
         self.listener = None
         self.running = False
         
-        # 按键状态跟踪
-        self.pressed_keys: Set = set()
+        # 按键状态跟踪（仅备用的Listener方式使用）
         self.cmd_pressed = False
         self.intercepted = False
         
         # 配置
-        self.terminal_apps = {'Terminal', 'iTerm2', 'iTerm', 'Hyper', 'Alacritty', 'Wezterm', 'stable', 'Warp'}
+        self.terminal_apps = terminal_apps if terminal_apps is not None else self.DEFAULT_TERMINAL_APPS
+        # 名称统一转为小写后精确匹配；'stable'是Warp的进程名，按子串匹配
+        self._terminal_exact = frozenset(app.lower() for app in self.terminal_apps)
+        self._terminal_substr = ('stable',)
         self.enabled = True
         
         # 防重复触发
         self.last_paste_time = 0
         self.paste_cooldown = 0.5  # 500ms 冷却时间
         
+        # 当前活跃应用缓存: (获取时间, 应用名称)，切换应用时由通知立即失效
+        self._app_cache = (0.0, None)
+        self._app_observer = None
+        
+        # NSWorkspace的活跃应用和切换通知依赖主线程运行循环更新，
+        # 只有run_main_loop正在运行时才使用，否则回退到AppleScript查询
+        self.workspace_live = False
+        
     def start_listening(self):
         """开始监听键盘事件"""
-        if not HAS_PYNPUT:
+        has_quartz = _lazy_quartz()
+        has_pynput = _lazy_pynput()
+        if not has_pynput and not has_quartz:
             print("Error: pynput not available")
             return False
             
@@ -70,12 +306,32 @@ class KeyboardHandler:
             
         try:
             self.running = True
-            self.listener = keyboard.Listener(
-                on_press=self._on_key_press,
-                on_release=self._on_key_release
-            )
+            
+            # 优先使用只过滤Cmd+V的CGEventTap，其他按键不经过Python
+            if has_quartz:
+                tap_listener = _EventTapListener(self._on_tap_cmd_v)
+                tap_listener.start()
+                if tap_listener.wait_ready():
+                    self.listener = tap_listener
+                    self._observe_app_activation()
+                    print("Keyboard event tap started (requires Accessibility permissions)")
+                    print("Press Cmd+V in terminal applications to test smart paste")
+                    return True
+                tap_listener.stop()
+                if not has_pynput:
+                    raise RuntimeError("failed to create event tap")
+                    
+            # 其次使用GlobalHotKeys，只有组合键命中时才回调；不可用时回退到逐键处理
+            if hasattr(keyboard, 'GlobalHotKeys'):
+                self.listener = keyboard.GlobalHotKeys({'<cmd>+v': self._on_hotkey})
+            else:
+                self.listener = keyboard.Listener(
+                    on_press=self._on_key_press,
+                    on_release=self._on_key_release
+                )
             
             self.listener.start()
+            self._observe_app_activation()
             print("Keyboard listener started (requires Accessibility permissions)")
             print("Press Cmd+V in terminal applications to test smart paste")
             return True
@@ -91,37 +347,110 @@ class KeyboardHandler:
         if self.listener:
             self.listener.stop()
             self.listener = None
+        if self._app_observer is not None:
+            NSWorkspace.sharedWorkspace().notificationCenter().removeObserver_(self._app_observer)
+            self._app_observer = None
         print("Keyboard listener stopped")
         
-    def _on_key_press(self, key):
-        """按键按下事件处理"""
+    def run_main_loop(self, stop_event: threading.Event) -> bool:
+        """
+        在主线程运行CFRunLoop直到stop_event被设置，使NSWorkspace的活跃应用信息和
+        应用切换通知得以更新（必须在主线程调用）
+        
+        Returns:
+            PyObjC不可用、未运行循环时返回False
+        """
+        if not _lazy_quartz():
+            return False
+            
+        self.workspace_live = True
+        self._app_cache = (0.0, None)
         try:
-            self.pressed_keys.add(key)
+            while not stop_event.is_set():
+                result = Quartz.CFRunLoopRunInMode(Quartz.kCFRunLoopDefaultMode,
+                                                   self.MAIN_LOOP_SLICE, False)
+                if result == Quartz.kCFRunLoopRunFinished:
+                    # 运行循环中没有输入源时会立即返回，避免空转
+                    stop_event.wait(self.MAIN_LOOP_SLICE)
+        finally:
+            self.workspace_live = False
+        return True
+        
+    def _observe_app_activation(self):
+        """订阅应用切换通知，切换时使活跃应用缓存失效"""
+        if not _lazy_quartz() or self._app_observer is not None:
+            return
+            
+        def on_activate(notification):
+            self._app_cache = (0.0, None)
             
+        try:
+            center = NSWorkspace.sharedWorkspace().notificationCenter()
+            self._app_observer = center.addObserverForName_object_queue_usingBlock_(
+                NSWorkspaceDidActivateApplicationNotification, None, None, on_activate
+            )
+        except Exception as e:
+            print(f"Error observing app activation: {e}")
+        
+    def _on_hotkey(self) -> bool:
+        """
+        Cmd+V组合键事件处理
+        
+        Returns:
+            是否已拦截处理（事件监听方式据此吞掉原始按键）
+        """
+        try:
+            if self.enabled and self._should_intercept():
+                current_time = time.time()
+                
+                # 防重复触发
+                if current_time - self.last_paste_time > self.paste_cooldown:
+                    self.last_paste_time = current_time
+                    self._handle_paste_event()
+                    return True
+                    
+        except Exception as e:
+            print(f"Error in hotkey handler: {e}")
+            
+        return False
+        
+    def _on_tap_cmd_v(self) -> bool:
+        """
+        事件tap中的Cmd+V回调，在tap线程同步执行，期间系统键盘输入被阻塞
+        
+        NSWorkspace可用时直接判断；否则查询活跃应用需要启动osascript子进程，
+        先吞掉按键交给后台线程判断，不拦截时再补发原生Cmd+V
+        """
+        if not self.enabled:
+            return False
+        if self.workspace_live:
+            return self._on_hotkey()
+            
+        threading.Thread(target=self._resolve_deferred_cmd_v, daemon=True).start()
+        return True
+        
+    def _resolve_deferred_cmd_v(self):
+        """后台判断被吞掉的Cmd+V，不需要拦截时补发原生粘贴"""
+        if not self._on_hotkey():
+            self._execute_native_paste()
+            
+    def _on_key_press(self, key):
+        """按键按下事件处理（备用Listener方式）"""
+        try:
             # 检测Command键
             if key == Key.cmd or key == Key.cmd_r:
                 self.cmd_pressed = True
                 
             # 检测Cmd+V组合
             elif key == KeyCode.from_char('v') and self.cmd_pressed:
-                if self.enabled and self._should_intercept():
-                    current_time = time.time()
-                    
-                    # 防重复触发
-                    if current_time - self.last_paste_time > self.paste_cooldown:
-                        self.last_paste_time = current_time
-                        self._handle_paste_event()
-                        return False  # 阻止事件继续传播
-                        
+                self._on_hotkey()
+                
         except Exception as e:
             print(f"Error in key press handler: {e}")
             
     def _on_key_release(self, key):
-        """按键释放事件处理"""
+        """按键释放事件处理（备用Listener方式）"""
         try:
-            if key in self.pressed_keys:
-                self.pressed_keys.remove(key)
-                
             # 重置Command键状态
             if key == Key.cmd or key == Key.cmd_r:
                 self.cmd_pressed = False
@@ -138,8 +467,7 @@ class KeyboardHandler:
                 return False
                 
             # 只在终端应用中拦截
-            is_terminal = any(terminal in current_app for terminal in self.terminal_apps)
-            if not is_terminal:
+            if not self.is_terminal_app(current_app):
                 return False
                 
             print(f"Intercepting paste in {current_app}")
@@ -149,19 +477,36 @@ class KeyboardHandler:
             print(f"Error checking intercept condition: {e}")
             return False
             
+    def is_terminal_app(self, app_name: str) -> bool:
+        """判断应用是否为支持的终端"""
+        name = app_name.lower()
+        if name in self._terminal_exact:
+            return True
+        return any(substr in name for substr in self._terminal_substr)
+        
     def _get_current_app(self) -> Optional[str]:
-        """获取当前活跃应用名称"""
+        """获取当前活跃应用名称（短时间内复用上次结果）"""
+        fetched_at, app_name = self._app_cache
+        now = time.monotonic()
+        if app_name is not None and now - fetched_at < self.APP_CACHE_TTL:
+            return app_name
+            
+        app_name = self._lookup_current_app()
+        self._app_cache = (now, app_name)
+        return app_name
+        
+    def _lookup_current_app(self) -> Optional[str]:
+        """查询当前活跃应用名称"""
+        if self.workspace_live and _lazy_quartz():
+            try:
+                app = NSWorkspace.sharedWorkspace().frontmostApplication()
+                return app.localizedName() if app else None
+            except Exception as e:
+                print(f"Error getting current app via NSWorkspace: {e}")
+                
         try:
-            script = '''
-                tell application "System Events"
-                    set frontApp to name of first application process whose frontmost is true
-                end tell
-                return frontApp
-            '''
-            
-            result = subprocess.run(['osascript', '-e', script],
-                                  capture_output=True, text=True, timeout=2)
-                                  
+            result = _run_applescript('front_app', _FRONT_APP_SCRIPT, timeout=2, capture_output=True)
+            
             if result.returncode == 0:
                 return result.stdout.strip()
                 
@@ -188,7 +533,30 @@ class KeyboardHandler:
     def simulate_paste(self, content: str):
         """模拟粘贴文本到当前应用"""
         try:
-            if HAS_PYPERCLIP:
+            if _lazy_quartz():
+                pasteboard = NSPasteboard.generalPasteboard()
+                
+                # 保存当前剪贴板的全部内容（包括图片等非文本类型）
+                original_items = self._snapshot_pasteboard(pasteboard)
+                
+                # 设置新内容到剪贴板
+                pasteboard.clearContents()
+                pasteboard.setString_forType_(content, NSPasteboardTypeString)
+                
+                # 执行原始粘贴操作
+                self._execute_native_paste()
+                
+                # 恢复原始剪贴板内容（延迟恢复，给粘贴操作时间）
+                def restore_pasteboard():
+                    time.sleep(0.2)
+                    try:
+                        self._restore_pasteboard(pasteboard, original_items)
+                    except:
+                        pass
+                        
+                threading.Thread(target=restore_pasteboard, daemon=True).start()
+                
+            elif HAS_PYPERCLIP:
                 # 保存当前剪贴板内容
                 original_content = pyperclip.paste()
                 
@@ -214,34 +582,89 @@ class KeyboardHandler:
         except Exception as e:
             print(f"Error simulating paste: {e}")
             
+    @staticmethod
+    def _snapshot_pasteboard(pasteboard) -> list:
+        """复制剪贴板中每一项的所有类型数据"""
+        snapshot = []
+        for item in pasteboard.pasteboardItems() or ():
+            item_data = {}
+            for pasteboard_type in item.types():
+                data = item.dataForType_(pasteboard_type)
+                if data is not None:
+                    item_data[pasteboard_type] = data
+            snapshot.append(item_data)
+        return snapshot
+        
+    @staticmethod
+    def _restore_pasteboard(pasteboard, snapshot: list):
+        """将快照写回剪贴板"""
+        pasteboard.clearContents()
+        items = []
+        for item_data in snapshot:
+            item = NSPasteboardItem.alloc().init()
+            for pasteboard_type, data in item_data.items():
+                item.setData_forType_(data, pasteboard_type)
+            items.append(item)
+        if items:
+            pasteboard.writeObjects_(items)
+            
+    @staticmethod
+    def _post_key_events(events):
+        """依次发送(按下, 松开)键盘事件到HID事件流"""
+        for event in events:
+            Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+            
+    def simulate_cmd_v(self):
+        """
+        向当前应用发送一次系统粘贴（Cmd+V），由应用直接读取剪贴板
+        
+        剪贴板中已经是要粘贴的内容时使用，不需要改写和恢复剪贴板
+        """
+        self._execute_native_paste()
+        
     def _execute_native_paste(self):
         """执行原生粘贴操作"""
+        if _lazy_quartz():
+            try:
+                events = []
+                for key_down in (True, False):
+                    event = Quartz.CGEventCreateKeyboardEvent(None, _KEYCODE_V, key_down)
+                    Quartz.CGEventSetFlags(event, Quartz.kCGEventFlagMaskCommand)
+                    Quartz.CGEventSetIntegerValueField(event, Quartz.kCGEventSourceUserData,
+                                                       _SYNTHETIC_EVENT_MARK)
+                    events.append(event)
+                self._post_key_events(events)
+                return
+            except Exception as e:
+                print(f"Error posting Cmd+V via Quartz: {e}")
+                
         try:
             # 方法1: 通过AppleScript发送Cmd+V
-            script = '''
-                tell application "System Events"
-                    keystroke "v" using command down
-                end tell
-            '''
-            
-            subprocess.run(['osascript', '-e', script], timeout=2)
+            _run_applescript('native_paste', _NATIVE_PASTE_SCRIPT, timeout=2)
             
         except Exception as e:
             print(f"Error executing native paste: {e}")
             
     def type_text(self, text: str):
         """直接输入文本到当前应用"""
+        if _lazy_quartz():
+            try:
+                events = []
+                for i in range(0, len(text), _UNICODE_CHUNK):
+                    chunk = text[i:i + _UNICODE_CHUNK]
+                    length = len(chunk.encode('utf-16-le')) // 2
+                    for key_down in (True, False):
+                        event = Quartz.CGEventCreateKeyboardEvent(None, 0, key_down)
+                        Quartz.CGEventSetFlags(event, 0)  # 忽略用户仍按住的Command键
+                        Quartz.CGEventKeyboardSetUnicodeString(event, length, chunk)
+                        events.append(event)
+                self._post_key_events(events)
+                return
+            except Exception as e:
+                print(f"Error typing text via Quartz: {e}")
+                
         try:
-            # 转义特殊字符
-            escaped_text = text.replace('\\', '\\\\').replace('"', '\\"')
-            
-            script = f'''
-                tell application "System Events"
-                    keystroke "{escaped_text}"
-                end tell
-            '''
-            
-            subprocess.run(['osascript', '-e', script], timeout=5)
+            _run_applescript('keystroke', _KEYSTROKE_SCRIPT, text)
             
         except Exception as e:
             print(f"Error typing text: {e}")
@@ -253,28 +676,16 @@ class KeyboardHandler:
             
             if 'iTerm2' in current_app or 'iTerm' in current_app:
                 # iTerm2 特殊处理
-                escaped_text = text.replace('\\', '\\\\').replace('"', '\\"')
-                script = f'''
-                    tell application "iTerm2"
-                        tell current session of current tab of current window
-                            write text "{escaped_text}"
-                        end tell
-                    end tell
-                '''
+                script_name, script = 'iterm_write', _ITERM_WRITE_SCRIPT
             elif 'Terminal' in current_app:
                 # Terminal.app 特殊处理
-                escaped_text = text.replace('\\', '\\\\').replace('"', '\\"')
-                script = f'''
-                    tell application "Terminal"
-                        do script "{escaped_text}" in selected tab of front window
-                    end tell
-                '''
+                script_name, script = 'terminal_do', _TERMINAL_DO_SCRIPT
             else:
                 # 其他终端应用，使用通用方法
                 self.type_text(text)
                 return
                 
-            subprocess.run(['osascript', '-e', script], timeout=5)
+            _run_applescript(script_name, script, text)
             
         except Exception as e:
             print(f"Error sending text to terminal: {e}")
@@ -303,17 +714,40 @@ class KeyboardHandler:
         return self.running and self.listener and self.listener.running
         
     def check_permissions(self) -> bool:
-        """检查辅助功能权限"""
-        try:
-            # 尝试创建一个临时监听器来测试权限
-            test_listener = keyboard.Listener(on_press=lambda key: None)
-            test_listener.start()
-            time.sleep(0.1)
-            test_listener.stop()
-            return True
-        except Exception:
-            return False
-
+        """
+        检查辅助功能权限
+        
+        PyObjC可用时尝试创建与监听时相同的事件tap（未授权时返回NULL），
+        否则用pynput创建一个临时监听器测试
+        """
+        if _lazy_quartz():
+            try:
+                tap = Quartz.CGEventTapCreate(
+                    Quartz.kCGSessionEventTap,
+                    Quartz.kCGHeadInsertEventTap,
+                    Quartz.kCGEventTapOptionDefault,
+                    Quartz.CGEventMaskBit(Quartz.kCGEventKeyDown),
+                    lambda proxy, event_type, event, refcon: event,
+                    None
+                )
+                if tap is None:
+                    return False
+                Quartz.CFMachPortInvalidate(tap)
+                return True
+            except Exception:
+                return False
+                
+        if _lazy_pynput():
+            try:
+                test_listener = keyboard.Listener(on_press=lambda key: None)
+                test_listener.start()
+                time.sleep(0.1)
+                test_listener.stop()
+                return True
+            except Exception:
+                return False
+                
+        return False
 
 def test_keyboard_handler():
     """测试键盘处理器"""
@@ -346,7 +780,7 @@ def test_keyboard_handler():
                 time.sleep(2)
                 current_app = handler._get_current_app()
                 if current_app:
-                    is_terminal = any(terminal in current_app for terminal in handler.terminal_apps)
+                    is_terminal = handler.is_terminal_app(current_app)
                     status = "🎯 TERMINAL" if is_terminal else "📱 OTHER"
                     print(f"\rCurrent app: {current_app} {status}", end='', flush=True)
                     
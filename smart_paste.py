@@ -7,23 +7,82 @@ SmartPaste主程序
 import os
 import sys
 import time
+import queue
 import signal
+import ctypes
+import atexit
 import logging
+import logging.handlers
+import sysconfig
 import threading
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 from datetime import datetime
+from dataclasses import dataclass
 
 # 导入本地模块
 from clipboard_monitor import ClipboardMonitor
 from terminal_detector import TerminalDetector
-from file_transfer import FileTransfer
 from keyboard_handler import KeyboardHandler
 from config_manager import ConfigManager
 
+if TYPE_CHECKING:
+    from file_transfer import TransferResult
+
+# macOS的clonefile(2)：在APFS上创建写时复制的副本，与文件大小无关
+_clonefile = None
+if sys.platform == 'darwin':
+    try:
+        _clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        _clonefile.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32)
+        _clonefile.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _clonefile = None
+
+def _fast_copy(src: str, dst: str):
+    """
+    复制文件，优先使用APFS克隆，不支持时回退到shutil.copyfile（内核态复制）
+    
+    先复制到同目录的临时文件再替换目标，源和目标是同一文件（路径写法不同或经符号链接）
+    时直接返回，不会删除源文件
+    """
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except FileNotFoundError:
+        pass  # 目标尚不存在
+        
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        # 跨卷或非APFS时clonefile失败
+        if _clonefile is None or _clonefile(os.fsencode(src), os.fsencode(tmp_path), 0) != 0:
+            import shutil
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# dataclass(slots=True) 需要 Python 3.10+，旧版本退回普通dataclass
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_OPTIONS)
+class PasteStats:
+    """运行统计"""
+    pastes_handled: int = 0
+    images_uploaded: int = 0
+    errors: int = 0
+    last_activity_ns: int = 0  # time.monotonic_ns()，0表示尚无活动
+
 class SmartPaste:
     """SmartPaste主类"""
     
+    # 退出时等待后台上传队列清空的最长时间（秒）
+    UPLOAD_DRAIN_TIMEOUT = 30.0
+    
     def __init__(self, config_dir: Optional[str] = None):
         """
         初始化SmartPaste
@@ -35,25 +94,39 @@ class SmartPaste:
         self.config = self.config_manager.get_config()
         
         # 初始化各个模块
-        self.clipboard_monitor = ClipboardMonitor()
+        self.clipboard_monitor = ClipboardMonitor(
+            busy_poll_s=self.config.poll_interval_busy_ms / 1000,
+            max_poll_s=self.config.poll_interval_idle_ms / 1000,
+            cleanup_max_age_hours=self.config.cleanup_interval_hours
+        )
         self.terminal_detector = TerminalDetector()
-        self.file_transfer = FileTransfer()
-        self.keyboard_handler = KeyboardHandler(paste_callback=self._handle_smart_paste)
+        # 文件传输模块（及paramiko）在首次上传时才导入，--status等路径无需加载
+        self._file_transfer = None
+        self._file_transfer_lock = threading.Lock()
+        self.keyboard_handler = KeyboardHandler(paste_callback=self._handle_smart_paste,
+                                                terminal_apps=self.config.terminal_apps_set)
         
         # 状态管理
         self.running = False
         self.startup_time = None
+        self._stop_event = threading.Event()
+        
+        # 后台上传队列: (本地路径, 连接信息, 远程路径, 本地stat结果)，None表示退出
+        self._upload_queue = queue.Queue(maxsize=8)
+        self._upload_thread = None
+        
+        # 统计信息（键盘回调线程和上传线程都会更新，需加锁）
+        self._stats_lock = threading.Lock()
+        self.stats = PasteStats()
         
-        # 统计信息
-        self.stats = {
-            'pastes_handled': 0,
-            'images_uploaded': 0,
-            'errors': 0,
-            'last_activity': None
-        }
+        # 单调时钟与系统时间的对应关系，仅在显示时把单调时间换算为时刻
+        self._clock_origin = (time.monotonic_ns(), time.time())
         
         # 设置日志
+        self._log_handler: Optional[logging.handlers.QueueHandler] = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
         self._setup_logging()
+        atexit.register(self._stop_log_listener)
         
         # 信号处理
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -63,17 +136,61 @@ class SmartPaste:
         """设置日志记录"""
         log_file = self.config_manager.get_log_file_path('main')
         
-        logging.basicConfig(
-            level=logging.DEBUG if self.config.debug_mode else logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler(sys.stdout) if self.config.debug_mode else logging.NullHandler()
-            ]
-        )
+        # 实际的写文件/输出在QueueListener的后台线程中进行，粘贴线程只需入队
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [logging.FileHandler(log_file, delay=True)]
+        if self.config.debug_mode:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            
+        # 重复调用时（如--debug）替换之前的队列处理器
+        self._stop_log_listener()
+        root_logger = logging.getLogger()
+        if self._log_handler is not None:
+            root_logger.removeHandler(self._log_handler)
+            
+        log_queue = queue.Queue(-1)
+        self._log_handler = logging.handlers.QueueHandler(log_queue)
+        self._log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+        self._log_listener.start()
+        
+        root_logger.addHandler(self._log_handler)
+        root_logger.setLevel(logging.DEBUG if self.config.debug_mode else logging.INFO)
         
         self.logger = logging.getLogger('SmartPaste')
         self.logger.info("SmartPaste initialized")
+        self._check_free_threading()
+        
+    def _stop_log_listener(self):
+        """停止日志监听线程，写出队列中剩余的记录"""
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            for handler in self._log_listener.handlers:
+                handler.close()
+            self._log_listener = None
+            
+    def _check_free_threading(self):
+        """自由线程版Python（3.13t+）下GIL被扩展模块重新启用时给出提示"""
+        if not sysconfig.get_config_var('Py_GIL_DISABLED'):
+            return
+            
+        is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+        if is_gil_enabled and is_gil_enabled():
+            self.logger.warning("Free-threaded Python detected but the GIL is enabled "
+                                "(an extension module re-enabled it); set PYTHON_GIL=0 to force it off")
+        else:
+            self.logger.info("Running without the GIL")
+            
+    @property
+    def file_transfer(self):
+        """延迟创建的FileTransfer实例"""
+        if self._file_transfer is None:
+            with self._file_transfer_lock:
+                if self._file_transfer is None:
+                    from file_transfer import FileTransfer
+                    self._file_transfer = FileTransfer()
+        return self._file_transfer
         
     def _signal_handler(self, signum, frame):
         """信号处理器"""
@@ -119,8 +236,14 @@ class SmartPaste:
             # 启动剪贴板监听器
             self.clipboard_monitor.start_monitoring()
             
+            # 启动后台上传线程
+            if self.config.background_upload:
+                self._upload_thread = threading.Thread(target=self._upload_worker, daemon=True)
+                self._upload_thread.start()
+                
             self.running = True
             self.startup_time = datetime.now()
+            self._stop_event.clear()
             
             self.logger.info("SmartPaste started successfully")
             print("🚀 SmartPaste is running!")
@@ -135,6 +258,7 @@ class SmartPaste:
             
     def stop(self):
         """停止SmartPaste"""
+        self._stop_event.set()
         if not self.running:
             return
             
@@ -144,7 +268,19 @@ class SmartPaste:
             # 停止各个模块
             self.keyboard_handler.stop_listening()
             self.clipboard_monitor.stop_monitoring()
-            self.file_transfer.close()
+            if self._upload_thread:
+                # 排队上传的远程路径已经粘贴到终端，等待它们完成后再关闭连接
+                deadline = time.monotonic() + self.UPLOAD_DRAIN_TIMEOUT
+                try:
+                    self._upload_queue.put(None, timeout=self.UPLOAD_DRAIN_TIMEOUT)
+                except queue.Full:
+                    pass
+                self._upload_thread.join(max(0.0, deadline - time.monotonic()))
+                if self._upload_thread.is_alive():
+                    self.logger.warning("Pending uploads did not finish before shutdown")
+                self._upload_thread = None
+            if self._file_transfer is not None:
+                self._file_transfer.close_all()
             
             # 清理临时文件
             self.cleanup_temp_files()
@@ -170,8 +306,9 @@ class SmartPaste:
                 return
                 
             # 更新统计
-            self.stats['pastes_handled'] += 1
-            self.stats['last_activity'] = datetime.now()
+            with self._stats_lock:
+                self.stats.pastes_handled += 1
+                self.stats.last_activity_ns = time.monotonic_ns()
             
             if is_image:
                 self._handle_image_paste(content)
@@ -180,17 +317,23 @@ class SmartPaste:
                 
         except Exception as e:
             self.logger.error(f"Error in smart paste handler: {e}")
-            self.stats['errors'] += 1
+            with self._stats_lock:
+                self.stats.errors += 1
             
     def _handle_image_paste(self, image_path: str):
         """处理图片粘贴"""
         try:
             self.logger.info(f"Handling image paste: {image_path}")
             
-            # 检查文件大小
-            file_size = os.path.getsize(image_path)
+            # 检查文件大小（stat结果一并传给上传流程，避免重复stat）
+            local_stat = os.stat(image_path)
+            file_size = local_stat.st_size
             max_size = self.config.max_file_size_mb * 1024 * 1024
             
+            if file_size == 0:
+                self.logger.warning(f"Image is empty, skipping: {image_path}")
+                return
+                
             if file_size > max_size:
                 self.logger.warning(f"Image too large: {file_size} bytes (max: {max_size})")
                 self.keyboard_handler.send_text_to_terminal(f"# Image too large: {file_size/(1024*1024):.1f}MB")
@@ -201,7 +344,7 @@ class SmartPaste:
             
             if conn_info['is_ssh']:
                 # SSH连接，上传到远程服务器
-                self._upload_and_paste(image_path, conn_info)
+                self._upload_and_paste(image_path, conn_info, local_stat)
             else:
                 # 本地连接，复制到本地临时目录
                 self._copy_and_paste_local(image_path)
@@ -215,56 +358,110 @@ class SmartPaste:
         try:
             self.logger.debug(f"Handling text paste: {text[:50]}...")
             
-            # 对于文本，直接执行正常粘贴
-            self.keyboard_handler.simulate_paste(text)
+            # 剪贴板中已经是该文本，直接发送系统粘贴，无需改写剪贴板
+            self.keyboard_handler.simulate_cmd_v()
             
         except Exception as e:
             self.logger.error(f"Error handling text paste: {e}")
             
-    def _upload_and_paste(self, local_path: str, conn_info: Dict[str, Any]):
+    def _upload_and_paste(self, local_path: str, conn_info: Dict[str, Any],
+                          local_stat: Optional[os.stat_result] = None):
         """上传文件并粘贴远程路径"""
         try:
-            self.logger.info(f"Uploading to {conn_info['username']}@{conn_info['hostname']}")
-            
-            # 连接SSH
-            if not self.file_transfer.connect_ssh(
-                hostname=conn_info['hostname'],
-                username=conn_info['username'],
-                port=conn_info['port'] or 22
-            ):
-                self.keyboard_handler.send_text_to_terminal("# SSH connection failed")
-                return
-                
-            # 生成远程路径
+            # 远程路径只由文件名和配置决定，可以在上传前确定
             remote_path = self.file_transfer.generate_remote_path(
                 local_path, self.config.remote_temp_dir
             )
             
-            # 上传文件
-            def progress_callback(filename, size, sent):
-                if sent == size:  # 上传完成
-                    self.logger.info(f"Upload completed: {filename}")
+            if self._upload_thread:
+                try:
+                    self._upload_queue.put_nowait((local_path, conn_info, remote_path, local_stat))
+                except queue.Full:
+                    self.logger.warning("Upload queue full, uploading synchronously")
+                else:
+                    # 先粘贴远程路径，上传在后台完成，失败时只记录错误
+                    self.keyboard_handler.send_text_to_terminal(remote_path)
+                    self.logger.info(f"Pasted remote path, upload queued: {remote_path}")
+                    return
                     
-            result = self.file_transfer.upload_file_with_retry(
-                local_path, remote_path, 
-                max_retries=self.config.scp_retry_count,
-                progress_callback=progress_callback
-            )
+            result = self._upload(local_path, conn_info, remote_path, local_stat)
             
             if result.success:
                 # 上传成功，粘贴远程路径
                 self.keyboard_handler.send_text_to_terminal(result.remote_path)
-                self.stats['images_uploaded'] += 1
                 self.logger.info(f"Successfully pasted remote path: {result.remote_path}")
             else:
                 # 上传失败，显示错误信息
                 self.keyboard_handler.send_text_to_terminal(f"# Upload failed: {result.error_message}")
-                self.logger.error(f"Upload failed: {result.error_message}")
                 
         except Exception as e:
             self.logger.error(f"Error uploading file: {e}")
             self.keyboard_handler.send_text_to_terminal(f"# Error: {str(e)}")
             
+    def _upload(self, local_path: str, conn_info: Dict[str, Any], remote_path: str,
+                local_stat: Optional[os.stat_result] = None) -> 'TransferResult':
+        """连接远程主机并上传文件"""
+        from file_transfer import TransferResult
+        
+        self.logger.info(f"Uploading to {conn_info['username']}@{conn_info['hostname']}")
+        
+        # 连接SSH（使用返回的连接上传，不经过共享的ssh_client，后台和同步上传可同时进行）
+        client = self.file_transfer.get_connection(
+            hostname=conn_info['hostname'],
+            username=conn_info['username'],
+            port=conn_info['port'] or 22
+        )
+        if client is None:
+            self.logger.error("SSH connection failed")
+            return TransferResult(success=False, error_message="SSH connection failed")
+            
+        # 上传文件
+        def progress_callback(filename, size, sent):
+            if sent == size:  # 上传完成
+                self.logger.info(f"Upload completed: {filename}")
+                
+        result = self.file_transfer.upload_file_with_retry(
+            local_path, remote_path, 
+            max_retries=self.config.scp_retry_count,
+            progress_callback=progress_callback,
+            pipelined=self.config.sftp_pipelined,
+            local_stat=local_stat,
+            client=client
+        )
+        
+        if result.success:
+            with self._stats_lock:
+                self.stats.images_uploaded += 1
+        else:
+            self.logger.error(f"Upload failed: {result.error_message}")
+            
+        return result
+        
+    def _upload_worker(self):
+        """后台上传线程，依次处理上传队列"""
+        # 在第一次粘贴前导入paramiko并解析默认私钥，不占用粘贴时间
+        try:
+            self.file_transfer.preload_keys()
+        except Exception as e:
+            self.logger.warning(f"Error preloading SSH keys: {e}")
+            
+        while True:
+            item = self._upload_queue.get()
+            if item is None:
+                break
+                
+            local_path, conn_info, remote_path, local_stat = item
+            try:
+                result = self._upload(local_path, conn_info, remote_path, local_stat)
+                if not result.success:
+                    with self._stats_lock:
+                        self.stats.errors += 1
+                    print(f"❌ Upload of {remote_path} failed: {result.error_message}")
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats.errors += 1
+                self.logger.error(f"Error uploading file: {e}")
+                
     def _copy_and_paste_local(self, image_path: str):
         """复制到本地临时目录并粘贴路径"""
         try:
@@ -279,8 +476,7 @@ class SmartPaste:
                 local_temp_path = image_path
             else:
                 # 复制文件
-                import shutil
-                shutil.copy2(image_path, local_temp_path)
+                _fast_copy(image_path, local_temp_path)
                 self.logger.info(f"File copied to: {local_temp_path}")
                 
             # 粘贴路径
@@ -299,6 +495,11 @@ class SmartPaste:
         except Exception as e:
             self.logger.error(f"Error cleaning up temp files: {e}")
             
+    def _monotonic_to_datetime(self, monotonic_ns: int) -> datetime:
+        """将time.monotonic_ns()时间换算为本地时刻"""
+        origin_ns, origin_wall = self._clock_origin
+        return datetime.fromtimestamp(origin_wall + (monotonic_ns - origin_ns) / 1e9)
+        
     def show_status(self):
         """显示运行状态"""
         print("\n=== SmartPaste Status ===")
@@ -308,12 +509,12 @@ class SmartPaste:
             uptime = datetime.now() - self.startup_time
             print(f"Uptime: {uptime}")
             
-        print(f"Pastes handled: {self.stats['pastes_handled']}")
-        print(f"Images uploaded: {self.stats['images_uploaded']}")
-        print(f"Errors: {self.stats['errors']}")
+        print(f"Pastes handled: {self.stats.pastes_handled}")
+        print(f"Images uploaded: {self.stats.images_uploaded}")
+        print(f"Errors: {self.stats.errors}")
         
-        if self.stats['last_activity']:
-            print(f"Last activity: {self.stats['last_activity']}")
+        if self.stats.last_activity_ns:
+            print(f"Last activity: {self._monotonic_to_datetime(self.stats.last_activity_ns)}")
             
         # 显示当前终端状态
         try:
@@ -338,16 +539,17 @@ class SmartPaste:
             return False
             
         try:
-            while self.running:
-                time.sleep(1)
+            # 在主线程运行事件循环（NSWorkspace的活跃应用信息依赖它更新）直到停止；
+            # 没有PyObjC时直接阻塞等待停止信号。临时文件由剪贴板监听器的定时器定期清理
+            self.terminal_detector.workspace_live = True
+            if not self.keyboard_handler.run_main_loop(self._stop_event):
+                self.terminal_detector.workspace_live = False
+                self._stop_event.wait()
                 
-                # 定期清理临时文件
-                if datetime.now().minute % 30 == 0:
-                    threading.Thread(target=self.cleanup_temp_files, daemon=True).start()
-                    
         except KeyboardInterrupt:
             pass
         finally:
+            self.terminal_detector.workspace_live = False
             self.stop()
             
         return True
@@ -370,7 +572,7 @@ def main():
     
     # 应用命令行参数
     if args.debug:
-        smart_paste.config.debug_mode = True
+        smart_paste.config_manager.update_config(debug_mode=True)
         smart_paste._setup_logging()
         
     if args.status:
@@ -6,12 +6,53 @@
 
 import os
 import re
+import mmap
+import time
+import functools
 import subprocess
-import psutil
 from typing import Optional, Dict, List, Tuple
 from dataclasses import dataclass
+from pathlib import Path
 import json
 
+# 支持定位当前标签页的终端应用，以及被视为shell的进程名
+TERMINAL_APP_NAMES = frozenset({'Terminal', 'iTerm2', 'iTerm'})
+SHELL_NAMES = frozenset({'bash', 'zsh', 'fish', 'sh'})
+
+# ssh命令中需要带参数的选项，以及匹配ssh可执行文件（不含sshd、sshfs等）的正则
+_SSH_ARG_TAKERS = frozenset({
+    '-o', '-i', '-F', '-l', '-p', '-L', '-R', '-D', '-b', '-c', '-E',
+    '-e', '-I', '-J', '-m', '-O', '-Q', '-S', '-W', '-w'
+})
+_SSH_BIN_RE = re.compile(r'(?:^|/)ssh$')
+
+# SSH配置中的 "关键字 值" 行（注释行和空行不会匹配）
+_SSH_CONFIG_KV_RE = re.compile(rb'(?m)^[ \t]*([A-Za-z]\w*)[ \t]+(\S[^\r\n]*?)[ \t]*\r?$')
+
+# SSH配置解析结果的缓存文件，按配置文件的修改时间和大小判断是否失效
+SSH_CONFIG_CACHE_FILE = Path.home() / '.smartpaste' / 'ssh_config_cache.json'
+
+# 解析器版本，修改_parse_ssh_config的解析规则时递增，使旧版本缓存的结果失效
+SSH_CONFIG_PARSER_VERSION = 2
+
+# 终端会话中shell的父进程名
+SHELL_PARENT_NAMES = frozenset({'Terminal', 'iTerm2', 'login'})
+
+@functools.lru_cache(maxsize=None)
+def _ns_workspace():
+    """延迟导入AppKit，返回NSWorkspace类，PyObjC不可用时返回None"""
+    try:
+        from AppKit import NSWorkspace
+        return NSWorkspace
+    except ImportError:
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _psutil():
+    """延迟导入psutil，避免--status等不需要进程信息的路径承担导入开销"""
+    import psutil
+    return psutil
+
 @dataclass
 class SSHConnection:
     """SSH连接信息"""
@@ -24,55 +65,144 @@ class SSHConnection:
 class TerminalDetector:
     """终端检测器类"""
     
+    # 活跃终端PID和连接信息的缓存有效期（秒）
+    ACTIVE_PID_TTL = 0.3
+    CONNECTION_INFO_TTL = 2.0
+    
     def __init__(self):
         """初始化终端检测器"""
         self.ssh_config_cache = {}
         self._load_ssh_config()
         
+        # 缓存: (获取时间, shell PID) 和 (获取时间, shell PID, 连接信息)
+        self._pid_cache: Optional[Tuple[float, Optional[int]]] = None
+        self._conn_cache: Optional[Tuple[float, Optional[int], Dict]] = None
+        
+        # NSWorkspace的前台应用依赖主线程运行循环更新，由运行循环的所有者
+        # （SmartPaste.run_interactive）置为True，否则使用AppleScript查询
+        self.workspace_live = False
+        
     def _load_ssh_config(self):
-        """加载SSH配置文件"""
+        """加载SSH配置文件（配置未修改时直接使用缓存的解析结果）"""
         ssh_config_paths = [
             os.path.expanduser("~/.ssh/config"),
             "/etc/ssh/ssh_config"
         ]
         
+        # 缓存键: 每个存在的配置文件的 [路径, 修改时间, 大小]
+        cache_key = []
         for config_path in ssh_config_paths:
-            if os.path.exists(config_path):
-                try:
-                    self._parse_ssh_config(config_path)
-                except Exception as e:
-                    print(f"Warning: Error parsing SSH config {config_path}: {e}")
-                    
+            try:
+                st = os.stat(config_path)
+            except OSError:
+                continue
+            cache_key.append([config_path, st.st_mtime_ns, st.st_size])
+            
+        cached = self._read_ssh_config_cache()
+        if (cached and cached.get('version') == SSH_CONFIG_PARSER_VERSION
+                and cached.get('key') == cache_key):
+            self.ssh_config_cache = cached.get('hosts', {})
+            return
+            
+        for config_path, _, _ in cache_key:
+            try:
+                self._parse_ssh_config(config_path)
+            except Exception as e:
+                print(f"Warning: Error parsing SSH config {config_path}: {e}")
+                
+        self._write_ssh_config_cache(cache_key)
+        
+    @staticmethod
+    def _read_ssh_config_cache() -> Optional[Dict]:
+        """读取SSH配置缓存文件"""
+        try:
+            with open(SSH_CONFIG_CACHE_FILE, 'r') as f:
+                cached = json.load(f)
+            return cached if isinstance(cached, dict) else None
+        except (OSError, ValueError):
+            return None
+            
+    def _write_ssh_config_cache(self, cache_key: List):
+        """写入SSH配置缓存文件（先写临时文件再替换）"""
+        try:
+            SSH_CONFIG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = SSH_CONFIG_CACHE_FILE.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': SSH_CONFIG_PARSER_VERSION, 'key': cache_key,
+                           'hosts': self.ssh_config_cache}, f)
+            os.replace(tmp_path, SSH_CONFIG_CACHE_FILE)
+        except OSError as e:
+            print(f"Warning: Error writing SSH config cache: {e}")
+            
     def _parse_ssh_config(self, config_path: str):
-        """解析SSH配置文件"""
+        """解析SSH配置文件（mmap映射后直接在字节上匹配，不逐行构造字符串）"""
         try:
-            with open(config_path, 'r') as f:
-                content = f.read()
-                
-            current_host = None
-            for line in content.split('\n'):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                    
-                # Host 定义
-                if line.lower().startswith('host '):
-                    current_host = line.split()[1]
-                    if current_host not in self.ssh_config_cache:
-                        self.ssh_config_cache[current_host] = {}
-                        
-                # 其他配置项
-                elif current_host:
-                    parts = line.split(None, 1)
-                    if len(parts) == 2:
-                        key, value = parts
-                        self.ssh_config_cache[current_host][key.lower()] = value
+            fd = os.open(config_path, os.O_RDONLY)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    return
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                    current_host = None
+                    for match in _SSH_CONFIG_KV_RE.finditer(mm):
+                        key = match.group(1).decode('ascii').lower()
+                        value = match.group(2).decode('utf-8', 'replace')
                         
+                        # Host 定义
+                        if key == 'host':
+                            current_host = value.split()[0]
+                            if current_host not in self.ssh_config_cache:
+                                self.ssh_config_cache[current_host] = {}
+                                
+                        # 其他配置项
+                        elif current_host:
+                            self.ssh_config_cache[current_host][key] = value
+            finally:
+                os.close(fd)
+                
         except Exception as e:
             print(f"Error parsing SSH config: {e}")
             
     def get_active_terminal_pid(self) -> Optional[int]:
-        """获取活跃终端的PID"""
+        """获取活跃终端的PID（短时间内复用上次结果）"""
+        now = time.monotonic()
+        if self._pid_cache and now - self._pid_cache[0] < self.ACTIVE_PID_TTL:
+            return self._pid_cache[1]
+            
+        pid = self._find_active_terminal_pid()
+        self._pid_cache = (now, pid)
+        return pid
+        
+    def _find_active_terminal_pid(self) -> Optional[int]:
+        """查找活跃终端的PID"""
+        app_name, app_pid = self._get_frontmost_app()
+        
+        if app_name in TERMINAL_APP_NAMES:
+            # 终端只有一个会话时直接从进程树确定shell，无需AppleScript
+            shells = self._get_session_shells(app_pid) if app_pid else []
+            if len(shells) == 1:
+                return shells[0]
+                
+            # 多个标签页时通过当前标签页的TTY定位
+            pid = self._get_terminal_shell_pid(app_name)
+            if pid:
+                return pid
+            if shells:
+                return max(shells)
+                
+        # 方法2: 通过进程检测当前可能的终端
+        return self._get_current_shell_pid()
+        
+    def _get_frontmost_app(self) -> Tuple[Optional[str], Optional[int]]:
+        """获取前台应用的名称和PID（AppleScript方式无法获得PID）"""
+        workspace = _ns_workspace() if self.workspace_live else None
+        if workspace is not None:
+            try:
+                app = workspace.sharedWorkspace().frontmostApplication()
+                if app:
+                    return app.localizedName(), app.processIdentifier()
+            except Exception as e:
+                print(f"Error getting frontmost app via NSWorkspace: {e}")
+                
         try:
             # 方法1: 通过AppleScript获取前台Terminal/iTerm2
             script = '''
@@ -86,16 +216,33 @@ class TerminalDetector:
                                   capture_output=True, text=True, timeout=5)
             
             if result.returncode == 0:
-                app_name = result.stdout.strip()
-                if app_name in ['Terminal', 'iTerm2', 'iTerm']:
-                    return self._get_terminal_shell_pid(app_name)
-                    
+                return result.stdout.strip(), None
+                
         except Exception as e:
             print(f"Error getting active terminal via AppleScript: {e}")
             
-        # 方法2: 通过进程检测当前可能的终端
-        return self._get_current_shell_pid()
+        return None, None
         
+    def _get_session_shells(self, app_pid: int) -> List[int]:
+        """获取终端应用下各会话的顶层shell PID（不含shell中启动的子shell）"""
+        psutil = _psutil()
+        try:
+            shells = {}
+            for child in psutil.Process(app_pid).children(recursive=True):
+                try:
+                    if child.name() in SHELL_NAMES:
+                        shells[child.pid] = child.ppid()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                    
+            return [pid for pid, ppid in shells.items() if ppid not in shells]
+            
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return []
+        except Exception as e:
+            print(f"Error listing terminal shells: {e}")
+            return []
+            
     def _get_terminal_shell_pid(self, app_name: str) -> Optional[int]:
         """获取终端应用的shell PID"""
         try:
@@ -128,20 +275,19 @@ class TerminalDetector:
         
     def _get_pid_by_tty(self, tty: str) -> Optional[int]:
         """通过TTY获取进程PID"""
+        psutil = _psutil()
+        target = tty if tty.startswith('/dev/') else '/dev/' + tty
         try:
-            result = subprocess.run(['ps', '-t', tty.replace('/dev/', ''), '-o', 'pid,command'],
-                                  capture_output=True, text=True)
-            
-            lines = result.stdout.strip().split('\n')[1:]  # 跳过标题行
-            for line in lines:
-                parts = line.strip().split(None, 1)
-                if len(parts) >= 2:
-                    pid = int(parts[0])
-                    command = parts[1]
-                    # 找到shell进程
-                    if any(shell in command for shell in ['bash', 'zsh', 'fish', 'sh']):
-                        return pid
-                        
+            # 取该TTY上最早启动（PID最小）的shell，即会话的顶层shell
+            shell_pids = [
+                proc.info['pid']
+                for proc in psutil.process_iter(['pid', 'name', 'terminal'])
+                if proc.info['terminal'] == target
+                and (proc.info['name'] or '').lstrip('-') in SHELL_NAMES
+            ]
+            if shell_pids:
+                return min(shell_pids)
+                
         except Exception as e:
             print(f"Error getting PID by TTY: {e}")
             
@@ -149,18 +295,18 @@ class TerminalDetector:
         
     def _get_current_shell_pid(self) -> Optional[int]:
         """获取当前可能的shell PID（备用方法）"""
+        psutil = _psutil()
         try:
-            # 获取所有终端相关进程
+            # 一次遍历取得所有进程的名称和父PID，父进程在内存中查找
+            procs = {proc.info['pid']: proc.info for proc in psutil.process_iter(['pid', 'name', 'ppid'])}
+            
             terminal_procs = []
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'parent']):
-                try:
-                    if proc.info['name'] in ['bash', 'zsh', 'fish', 'sh']:
-                        parent = psutil.Process(proc.info['parent'])
-                        if parent.name() in ['Terminal', 'iTerm2', 'login']:
-                            terminal_procs.append(proc.info['pid'])
-                except:
-                    continue
-                    
+            for info in procs.values():
+                if info['name'] in SHELL_NAMES:
+                    parent = procs.get(info['ppid'])
+                    if parent and parent['name'] in SHELL_PARENT_NAMES:
+                        terminal_procs.append(info['pid'])
+                        
             # 返回最新的shell进程
             if terminal_procs:
                 return max(terminal_procs)
@@ -200,6 +346,7 @@ class TerminalDetector:
         
     def _detect_ssh_in_process_tree(self, shell_pid: int) -> Optional[SSHConnection]:
         """从进程树中检测SSH连接"""
+        psutil = _psutil()
         try:
             current_proc = psutil.Process(shell_pid)
             
@@ -207,7 +354,7 @@ class TerminalDetector:
             while current_proc:
                 try:
                     cmdline = current_proc.cmdline()
-                    if cmdline and len(cmdline) > 0 and 'ssh' in cmdline[0]:
+                    if cmdline and _SSH_BIN_RE.search(cmdline[0]):
                         return self._parse_ssh_command(cmdline, current_proc.pid)
                         
                     # 检查父进程
@@ -227,6 +374,7 @@ class TerminalDetector:
         
     def _detect_ssh_from_env(self, shell_pid: int) -> Optional[SSHConnection]:
         """从环境变量检测SSH连接"""
+        psutil = _psutil()
         try:
             proc = psutil.Process(shell_pid)
             env = proc.environ()
@@ -253,7 +401,7 @@ class TerminalDetector:
     def _parse_ssh_command(self, cmdline: List[str], pid: int) -> Optional[SSHConnection]:
         """解析SSH命令行"""
         try:
-            if not cmdline or 'ssh' not in cmdline[0]:
+            if not cmdline or not _SSH_BIN_RE.search(cmdline[0]):
                 return None
                 
             username = None
@@ -281,7 +429,7 @@ class TerminalDetector:
                     
                 # 跳过其他选项
                 elif arg.startswith('-'):
-                    if arg in ['-o', '-i', '-F']:  # 需要参数的选项
+                    if arg in _SSH_ARG_TAKERS:  # 需要参数的选项
                         i += 2
                     else:
                         i += 1
@@ -334,6 +482,19 @@ class TerminalDetector:
             包含连接信息的字典
         """
         shell_pid = self.get_active_terminal_pid()
+        
+        # 同一个shell短时间内连续粘贴时复用检测结果
+        now = time.monotonic()
+        cached = self._conn_cache
+        if cached and cached[1] == shell_pid and now - cached[0] < self.CONNECTION_INFO_TTL:
+            return dict(cached[2])
+            
+        conn_info = self._detect_connection_info(shell_pid)
+        self._conn_cache = (now, shell_pid, conn_info)
+        return dict(conn_info)
+        
+    def _detect_connection_info(self, shell_pid: Optional[int]) -> Dict[str, any]:
+        """检测指定shell的连接信息"""
         ssh_conn = self.detect_ssh_connection(shell_pid)
         
         if ssh_conn: